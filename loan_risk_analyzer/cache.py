@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Hashable, Optional
+
+MISSING = object()
+
+
+@dataclass
+class CacheStats:
+	size: int
+	maxsize: int
+	hits: int
+	misses: int
+	evictions: int
+	invalidations: int
+
+	@property
+	def hit_rate(self) -> float:
+		total = self.hits + self.misses
+		return self.hits / total if total else 0.0
+
+
+class LRUCache:
+	"""Thread-safe bounded LRU map with hit/miss/eviction counters. maxsize 0 disables caching.
+
+	Every invalidation bumps the key's generation. A reader captures generation(key) before loading
+	and passes it to put, which drops the value if the key was invalidated in between, so a load that
+	raced a write cannot refill the cache with pre-write data. Generations of the least recently
+	invalidated keys are forgotten beyond maxsize by raising a floor, which can only drop puts.
+	"""
+
+	def __init__(self, maxsize: int = 10_000) -> None:
+		self.maxsize = maxsize
+		self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+		self._generations: "OrderedDict[Hashable, int]" = OrderedDict()
+		self._counter = 0
+		self._floor = 0
+		self._lock = threading.Lock()
+		self._hits = 0
+		self._misses = 0
+		self._evictions = 0
+		self._invalidations = 0
+
+	def get(self, key: Hashable) -> Any:
+		"""Return the cached value or MISSING."""
+		with self._lock:
+			try:
+				value = self._data[key]
+			except KeyError:
+				self._misses += 1
+				return MISSING
+			self._data.move_to_end(key)
+			self._hits += 1
+			return value
+
+	def generation(self, key: Hashable) -> int:
+		with self._lock:
+			return self._generations.get(key, self._floor)
+
+	def put(self, key: Hashable, value: Any, generation: Optional[int] = None) -> None:
+		"""Store value; with generation, only if the key has not been invalidated since it was read."""
+		if self.maxsize <= 0:
+			return
+		with self._lock:
+			if generation is not None and self._generations.get(key, self._floor) != generation:
+				return
+			self._data[key] = value
+			self._data.move_to_end(key)
+			while len(self._data) > self.maxsize:
+				self._data.popitem(last=False)
+				self._evictions += 1
+
+	def invalidate(self, key: Hashable) -> None:
+		with self._lock:
+			self._counter += 1
+			self._generations[key] = self._counter
+			self._generations.move_to_end(key)
+			while len(self._generations) > max(self.maxsize, 1):
+				_, gen = self._generations.popitem(last=False)
+				self._floor = max(self._floor, gen)
+			if self._data.pop(key, MISSING) is not MISSING:
+				self._invalidations += 1
+
+	def clear(self) -> None:
+		with self._lock:
+			self._invalidations += len(self._data)
+			self._data.clear()
+			self._counter += 1
+			self._floor = self._counter
+			self._generations.clear()
+
+	def stats(self) -> CacheStats:
+		with self._lock:
+			return CacheStats(
+				size=len(self._data),
+				maxsize=self.maxsize,
+				hits=self._hits,
+				misses=self._misses,
+				evictions=self._evictions,
+				invalidations=self._invalidations,
+			)
+
+	def reset_stats(self) -> None:
+		with self._lock:
+			self._hits = self._misses = self._evictions = self._invalidations = 0
+
+
+def _default_maxsize() -> int:
+	return int(os.environ.get("LOANS_CACHE_SIZE", "10000"))
+
+
+repo_cache = LRUCache(_default_maxsize())
@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass, field
+from datetime import date
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import yaml
+from sqlalchemy import Select, and_, case, func, or_, select
+from sqlalchemy.orm import Session
+
+from .models import Loan, LoanOutcome, RiskAssessment
+from .pd_model import PDConfig
+
+FEATURES = ("dscr", "ltv", "coverage")
+
+# Linear predictors are bucketed on a fixed logit grid for the evaluation pass, so AUC and
+# decile calibration need O(bins) memory instead of holding every score.
+_EVAL_LOGIT_RANGE = 20.0
+_EVAL_BINS = 4000
+
+ChunkSource = Callable[[], Iterator[Tuple[np.ndarray, np.ndarray]]]
+
+
+@dataclass
+class CalibrationResult:
+	config: PDConfig
+	n_obs: int
+	n_defaults: int
+	iterations: int
+	converged: bool
+	auc: float
+	brier: float
+	deciles: List[Dict[str, float]] = field(default_factory=list)
+
+	def stats(self) -> Dict[str, Any]:
+		return {
+			"fitted_on": date.today().isoformat(),
+			"n_obs": self.n_obs,
+			"n_defaults": self.n_defaults,
+			"iterations": self.iterations,
+			"converged": self.converged,
+			"auc": round(self.auc, 6),
+			"brier": round(self.brier, 6),
+			"deciles": self.deciles,
+		}
+
+
+def training_query(horizon_days: int = 365, as_of: Optional[date] = None) -> Select:
+	"""Labelled assessments: 1 when a recorded default followed within the horizon, else 0.
+
+	Loans with a recorded outcome contribute every assessment up to the outcome date. Active loans
+	without one contribute assessments at least horizon_days older than as_of (default today); they
+	are known to have survived the horizon. Newer assessments of active loans are still unresolved.
+	"""
+	observed_on = (as_of or date.today()).isoformat()
+	days_to_outcome = func.julianday(LoanOutcome.outcome_date) - func.julianday(RiskAssessment.as_of_date)
+	label = case(
+		(and_(LoanOutcome.defaulted.is_(True), days_to_outcome <= horizon_days), 1),
+		else_=0,
+	)
+	resolved = and_(LoanOutcome.outcome_id.is_not(None), RiskAssessment.as_of_date <= LoanOutcome.outcome_date)
+	survived = and_(
+		LoanOutcome.outcome_id.is_(None),
+		Loan.status == "active",
+		func.julianday(observed_on) - func.julianday(RiskAssessment.as_of_date) >= horizon_days,
+	)
+	return (
+		select(RiskAssessment.dscr, RiskAssessment.ltv, RiskAssessment.collateral_coverage, label)
+		.join(Loan, Loan.loan_id == RiskAssessment.loan_id)
+		.outerjoin(LoanOutcome, LoanOutcome.loan_id == RiskAssessment.loan_id)
+		.where(or_(resolved, survived))
+	)
+
+
+def iter_training_chunks(session: Session, horizon_days: int = 365, chunk_size: int = 100_000, as_of: Optional[date] = None) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+	"""Yield (X, y) design-matrix chunks straight off the SQLite cursor."""
+	stmt = training_query(horizon_days, as_of).execution_options(yield_per=chunk_size)
+	result = session.execute(stmt)
+	for rows in result.partitions(chunk_size):
+		arr = np.asarray(rows, dtype=float)
+		feats = arr[:, :3]
+		# Same treatment as PDModel.predict: missing/non-finite features contribute nothing.
+		feats = np.where(np.isfinite(feats), feats, 0.0)
+		X = np.column_stack([np.ones(len(arr)), feats])
+		yield X, arr[:, 3]
+
+
+def _sigmoid(eta: np.ndarray) -> np.ndarray:
+	return 1.0 / (1.0 + np.exp(-np.clip(eta, -35.0, 35.0)))
+
+
+def fit_logistic(chunks: ChunkSource, max_iter: int = 25, tol: float = 1e-8, l2: float = 0.0) -> Tuple[np.ndarray, int, bool, int, int]:
+	"""Newton-Raphson logistic fit; every iteration is one streaming pass accumulating gradient and Hessian.
+
+	Returns (beta, iterations, converged, n_obs, n_defaults). beta is ordered intercept, dscr, ltv, coverage.
+	"""
+	k = 1 + len(FEATURES)
+	beta = np.zeros(k)
+	penalty = np.full(k, l2)
+	penalty[0] = 0.0
+	n_obs = n_pos = 0
+	for iteration in range(1, max_iter + 1):
+		grad = np.zeros(k)
+		hess = np.zeros((k, k))
+		n_obs = n_pos = 0
+		for X, y in chunks():
+			p = _sigmoid(X @ beta)
+			grad += X.T @ (y - p)
+			hess += (X * (p * (1.0 - p))[:, None]).T @ X
+			n_obs += len(y)
+			n_pos += int(y.sum())
+		if n_obs == 0:
+			raise ValueError("No resolved assessments; record loan outcomes or wait for active loans to pass the horizon")
+		if n_pos == 0 or n_pos == n_obs:
+			raise ValueError("Calibration needs both defaulted and non-defaulted observations")
+		grad -= penalty * beta
+		hess += np.diag(penalty)
+		try:
+			step = np.linalg.solve(hess, grad)
+		except np.linalg.LinAlgError:
+			step = np.linalg.lstsq(hess, grad, rcond=None)[0]
+		beta = beta + step
+		if np.max(np.abs(step)) < tol:
+			return beta, iteration, True, n_obs, n_pos
+	return beta, max_iter, False, n_obs, n_pos
+
+
+def evaluate(chunks: ChunkSource, beta: np.ndarray, bins: int = _EVAL_BINS) -> Tuple[float, float, List[Dict[str, float]]]:
+	"""Single streaming pass computing AUC, Brier score and calibration by decile of predicted PD."""
+	n_bin = np.zeros(bins)
+	pos_bin = np.zeros(bins)
+	p_bin = np.zeros(bins)
+	sq_err = 0.0
+	for X, y in chunks():
+		eta = X @ beta
+		p = _sigmoid(eta)
+		sq_err += float(np.sum((p - y) ** 2))
+		idx = ((eta + _EVAL_LOGIT_RANGE) / (2 * _EVAL_LOGIT_RANGE) * bins).astype(int)
+		idx = np.clip(idx, 0, bins - 1)
+		n_bin += np.bincount(idx, minlength=bins)
+		pos_bin += np.bincount(idx, weights=y, minlength=bins)
+		p_bin += np.bincount(idx, weights=p, minlength=bins)
+	n = n_bin.sum()
+	n_pos = pos_bin.sum()
+	neg_bin = n_bin - pos_bin
+	n_neg = neg_bin.sum()
+	neg_below = np.cumsum(neg_bin) - neg_bin
+	auc = float(np.sum(pos_bin * (neg_below + 0.5 * neg_bin)) / (n_pos * n_neg)) if n_pos and n_neg else float("nan")
+	brier = float(sq_err / n) if n else float("nan")
+
+	cum_start = np.cumsum(n_bin) - n_bin
+	decile_of_bin = np.minimum((10 * cum_start / max(n, 1)).astype(int), 9)
+	d_n = np.bincount(decile_of_bin, weights=n_bin, minlength=10)
+	d_pos = np.bincount(decile_of_bin, weights=pos_bin, minlength=10)
+	d_p = np.bincount(decile_of_bin, weights=p_bin, minlength=10)
+	deciles = []
+	for d in range(10):
+		if d_n[d] == 0:
+			continue
+		deciles.append({
+			"decile": d + 1,
+			"count": int(d_n[d]),
+			"mean_pd": round(float(d_p[d] / d_n[d]), 6),
+			"observed_default_rate": round(float(d_pos[d] / d_n[d]), 6),
+		})
+	return auc, brier, deciles
+
+
+def calibrate_pd(
+	session: Session,
+	version: Optional[str] = None,
+	horizon_days: int = 365,
+	as_of: Optional[date] = None,
+	chunk_size: int = 100_000,
+	max_iter: int = 25,
+	tol: float = 1e-8,
+	l2: float = 0.0,
+) -> CalibrationResult:
+	def chunks() -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+		return iter_training_chunks(session, horizon_days, chunk_size, as_of)
+
+	beta, iterations, converged, n_obs, n_pos = fit_logistic(chunks, max_iter=max_iter, tol=tol, l2=l2)
+	auc, brier, deciles = evaluate(chunks, beta)
+	config = PDConfig(
+		intercept=float(beta[0]),
+		beta_dscr=float(beta[1]),
+		beta_ltv=float(beta[2]),
+		beta_coverage=float(beta[3]),
+		version=version or f"calibrated-{date.today():%Y%m%d}",
+	)
+	result = CalibrationResult(
+		config=config,
+		n_obs=n_obs,
+		n_defaults=n_pos,
+		iterations=iterations,
+		converged=converged,
+		auc=auc,
+		brier=brier,
+		deciles=deciles,
+	)
+	config.calibration = result.stats()
+	return result
+
+
+def write_pd_config(result: CalibrationResult, path: Path) -> Path:
+	data = asdict(result.config)
+	for key in ("intercept", "beta_dscr", "beta_ltv", "beta_coverage"):
+		data[key] = round(data[key], 6)
+	path.parent.mkdir(parents=True, exist_ok=True)
+	path.write_text(yaml.safe_dump(data, sort_keys=False))
+	return path
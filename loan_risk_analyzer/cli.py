@@ -1,16 +1,18 @@
 from __future__ import annotations
 
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 
 import csv
+import math
 import typer
 from rich import print
 from rich.table import Table
 
 from .db import init_db, get_session
 from . import repositories as repo
+from .models import OutcomeType
 from .services import assess_loan
 
 app = typer.Typer(no_args_is_help=True)
@@ -23,6 +25,15 @@ def initdb() -> None:
 	print("[green]Database initialized.[/green]")
 
 
+@app.command("db-migrate")
+def db_migrate() -> None:
+	"""Create missing tables and apply pending schema migrations to an existing database."""
+	applied = init_db()
+	for m in applied:
+		print(f"Applied migration {m.version}: {m.name}")
+	print(f"[green]Schema up to date ({len(applied)} applied).[/green]")
+
+
 @app.command()
 def seed() -> None:
 	"""Seed demo data."""
@@ -100,6 +111,60 @@ def assess(loan_id: int = typer.Argument(...)) -> None:
 			print(f"DSCR={ra.dscr:.2f} LTV={ra.ltv:.2f} Coverage={ra.collateral_coverage:.2f} PD={ra.pd:.2%} Grade={ra.risk_grade} {ra.recommendation}")
 
 
+@app.command("enqueue-assess")
+def enqueue_assess(
+	loan_ids: Optional[List[int]] = typer.Argument(None, help="One loan, or several as a loan-set job"),
+	portfolio: bool = typer.Option(False, help="Assess every active loan"),
+	priority: int = typer.Option(0),
+) -> None:
+	"""Queue an assessment job for the worker pool."""
+	from .jobs import enqueue_loan, enqueue_loans, enqueue_portfolio
+	if not portfolio and not loan_ids:
+		raise typer.BadParameter("Pass loan IDs or --portfolio")
+	with get_session() as session:
+		if portfolio:
+			job_id = enqueue_portfolio(session, priority=priority)
+		elif len(loan_ids) == 1:
+			job_id = enqueue_loan(session, loan_ids[0], priority=priority)
+		else:
+			job_id = enqueue_loans(session, loan_ids, priority=priority)
+	print(f"[green]Queued job {job_id}.[/green]")
+
+
+@app.command("worker")
+def worker(
+	workers: int = typer.Option(4, help="Worker threads"),
+	batch_size: int = typer.Option(10, help="Jobs claimed per round trip"),
+	lease_seconds: int = typer.Option(300, help="Running jobs older than this are reclaimed"),
+	drain: bool = typer.Option(True, "--drain/--forever", help="Exit once the queue is empty"),
+	report_interval: float = typer.Option(5.0),
+) -> None:
+	"""Process queued assessment jobs."""
+	from .db import SessionLocal
+	from .jobs import WorkerPool
+
+	def report(depth: dict, stats) -> None:
+		print(f"queued={depth['queued']} running={depth['running']} done={depth['done']} failed={depth['failed']} superseded={depth['superseded']} | processed={stats.processed} ({stats.throughput:.1f}/s)")
+
+	pool = WorkerPool(SessionLocal, workers=workers, batch_size=batch_size, lease_seconds=lease_seconds)
+	stats = pool.run(drain=drain, report=report, report_interval=report_interval)
+	print(f"[green]Worker pool finished: {stats.succeeded} succeeded, {stats.retried} retried, {stats.failed} failed, {stats.superseded} superseded, {stats.throughput:.1f} jobs/s.[/green]")
+
+
+@app.command("queue-status")
+def queue_status() -> None:
+	"""Show assessment job counts by status."""
+	from .jobs import queue_depth
+	with get_session() as session:
+		depth = queue_depth(session)
+	t = Table(title="Assessment Queue")
+	t.add_column("Status")
+	t.add_column("Jobs")
+	for status, n in depth.items():
+		t.add_row(status, f"{n:,}")
+	print(t)
+
+
 @app.command("portfolio-summary")
 def portfolio_summary() -> None:
 	with get_session() as session:
@@ -131,15 +196,131 @@ def portfolio_summary() -> None:
 		print(t)
 
 
+@app.command("outcome-record")
+def outcome_record(
+	loan_id: int = typer.Argument(...),
+	outcome_type: OutcomeType = typer.Option(..., case_sensitive=False, help="Terminal outcome; default and charged_off count as defaults"),
+	outcome_date: Optional[datetime] = typer.Option(None, formats=["%Y-%m-%d"]),
+	notes: Optional[str] = typer.Option(None),
+) -> None:
+	"""Record the observed outcome of a loan for PD calibration."""
+	with get_session() as session:
+		row = repo.record_loan_outcome(session, loan_id, outcome_date.date() if outcome_date else date.today(), outcome_type, notes=notes)
+		defaulted = row.defaulted
+	print(f"[green]Recorded outcome '{outcome_type.value}' ({'default' if defaulted else 'non-default'}) for loan {loan_id}.[/green]")
+
+
+@app.command("calibrate-pd")
+def calibrate_pd_cmd(
+	out: Optional[Path] = typer.Option(None, help="Output YAML; defaults to config/pd-<version>.yaml. Assessments use config/pd.yaml unless LOANS_PD_CONFIG points at another file"),
+	version: Optional[str] = typer.Option(None, help="Version tag; defaults to calibrated-YYYYMMDD"),
+	horizon_days: int = typer.Option(365, help="Default must follow the assessment within this many days"),
+	as_of: Optional[datetime] = typer.Option(None, formats=["%Y-%m-%d"], help="Observation date for active loans; defaults to today"),
+	chunk_size: int = typer.Option(100_000, help="Rows streamed from SQLite per chunk"),
+	max_iter: int = typer.Option(25),
+	l2: float = typer.Option(0.0, help="Ridge penalty on the betas (not the intercept)"),
+	force: bool = typer.Option(False, "--force", help="Write the config even if the fit did not converge"),
+) -> None:
+	"""Fit PD coefficients by logistic regression over assessments joined to loan outcomes."""
+	from .calibration import calibrate_pd, write_pd_config
+	with get_session() as session:
+		result = calibrate_pd(session, version=version, horizon_days=horizon_days, as_of=as_of.date() if as_of else None, chunk_size=chunk_size, max_iter=max_iter, l2=l2)
+	cfg = result.config
+	path = out or Path(__file__).resolve().parents[1] / "config" / f"pd-{cfg.version}.yaml"
+	t = Table(title=f"PD Calibration {cfg.version}")
+	t.add_column("Metric")
+	t.add_column("Value")
+	t.add_row("Observations", f"{result.n_obs:,}")
+	t.add_row("Defaults", f"{result.n_defaults:,}")
+	t.add_row("Iterations", f"{result.iterations}{'' if result.converged else ' (not converged)'}")
+	t.add_row("intercept", f"{cfg.intercept:.4f}")
+	t.add_row("beta_dscr", f"{cfg.beta_dscr:.4f}")
+	t.add_row("beta_ltv", f"{cfg.beta_ltv:.4f}")
+	t.add_row("beta_coverage", f"{cfg.beta_coverage:.4f}")
+	t.add_row("AUC", f"{result.auc:.4f}")
+	t.add_row("Brier", f"{result.brier:.4f}")
+	print(t)
+	d = Table(title="Calibration by Decile")
+	d.add_column("Decile")
+	d.add_column("Count")
+	d.add_column("Mean PD")
+	d.add_column("Observed DR")
+	for row in result.deciles:
+		d.add_row(str(row["decile"]), f"{row['count']:,}", f"{row['mean_pd']:.2%}", f"{row['observed_default_rate']:.2%}")
+	print(d)
+	if not result.converged and not force:
+		print(f"[red]Fit did not converge in {result.iterations} iterations; not writing {path}. Raise --max-iter, add --l2, or pass --force.[/red]")
+		raise typer.Exit(code=1)
+	write_pd_config(result, path)
+	print(f"[green]Wrote {path}[/green]")
+	print(f"Activate with LOANS_PD_CONFIG={path} or copy it to config/pd.yaml.")
+
+
+@app.command("sensitivity")
+def sensitivity(
+	loan_id: Optional[int] = typer.Argument(None, help="Single loan; omit for the whole active book"),
+	limit: int = typer.Option(20, help="Rows to show, tightest NOI cushion first"),
+) -> None:
+	"""Breakeven NOI, interest rate and collateral value before guardrails or grade change."""
+	from .sensitivity import sensitivities_for_loans, sensitivity_records
+	with get_session() as session:
+		result = sensitivities_for_loans(session, [loan_id] if loan_id is not None else None)
+	# No NOI at all (NaN cushion) is the tightest case.
+	records = sorted(sensitivity_records(result), key=lambda r: -math.inf if math.isnan(r["noi_cushion_pct"]) else r["noi_cushion_pct"])
+	t = Table(title=f"Sensitivity ({len(records):,} loans)")
+	for col in ("Loan ID", "DSCR", "LTV", "NOI Breakeven", "NOI Cushion", "Max Rate", "Rate Cushion (bps)", "Collateral Cushion", "Grade Cushion"):
+		t.add_column(col)
+	for r in records[:limit]:
+		t.add_row(
+			str(r["loan_id"]),
+			f"{r['dscr']:.2f}",
+			f"{r['ltv']:.2f}",
+			f"{r['noi_breakeven']:,.0f}",
+			f"{r['noi_cushion_pct']:.1%}",
+			f"{r['max_rate']:.2%}",
+			f"{r['rate_cushion_bps']:,.0f}",
+			f"{r['collateral_cushion_pct']:.1%}",
+			f"{r['collateral_cushion_grade_pct']:.1%}",
+		)
+	print(t)
+
+
+@app.command("watchlist-scan")
+def watchlist_scan(
+	baseline_date: Optional[datetime] = typer.Option(None, formats=["%Y-%m-%d"], help="Compare against each loan's latest assessment on or before this date instead of its previous one"),
+	full: bool = typer.Option(False, help="Rescan all assessments instead of only those since the last scan"),
+	jsonl: Path = typer.Option(Path("watchlist_alerts.jsonl"), help="Alert events are appended here"),
+) -> None:
+	"""Flag loans whose grade worsened, DSCR fell below the floor or recommendation flipped to Decline."""
+	from .watchlist import append_alerts_jsonl, run_watchlist_scan
+	with get_session() as session:
+		scan, events = run_watchlist_scan(session, baseline_date=baseline_date.date() if baseline_date else None, since_last_scan=not full)
+		scan_id, from_id, to_id = scan.scan_id, scan.from_assessment_id, scan.to_assessment_id
+	append_alerts_jsonl(events, jsonl)
+	t = Table(title=f"Watchlist scan {scan_id} (assessments {from_id + 1}-{to_id})")
+	t.add_column("Loan ID")
+	t.add_column("Assessment")
+	t.add_column("Rule")
+	t.add_column("Severity")
+	t.add_column("Change")
+	for ev in events:
+		t.add_row(str(ev.loan_id), str(ev.assessment_id), ev.rule, ev.severity, ev.message)
+	print(t)
+	print(f"[green]{len(events)} alert(s) recorded.[/green]")
+
+
 @app.command("export-deals")
 def export_deals(out: Path = typer.Option(Path("deals.csv"))) -> None:
+	from .sensitivity import SENSITIVITY_COLUMNS, sensitivities_for_loans, sensitivity_records
 	with get_session() as session:
 		loans = repo.list_active_loans(session)
+		sens = {r["loan_id"]: r for r in sensitivity_records(sensitivities_for_loans(session))}
 		with out.open("w", newline="") as f:
 			writer = csv.writer(f)
-			writer.writerow(["loan_id", "borrower", "amount", "rate", "term", "dscr", "ltv", "coverage", "pd", "grade", "recommendation"])
+			writer.writerow(["loan_id", "borrower", "amount", "rate", "term", "dscr", "ltv", "coverage", "pd", "grade", "recommendation", *SENSITIVITY_COLUMNS])
 			for ln in loans:
 				ra = repo.latest_assessment_for_loan(session, ln.loan_id)
+				s = sens.get(ln.loan_id, {})
 				writer.writerow([
 					ln.loan_id,
 					ln.borrower.name,
@@ -152,6 +333,7 @@ def export_deals(out: Path = typer.Option(Path("deals.csv"))) -> None:
 					getattr(ra, "pd", None),
 					getattr(ra, "risk_grade", None),
 					getattr(ra, "recommendation", None),
+					*(s.get(c) for c in SENSITIVITY_COLUMNS),
 				])
 	print(f"[green]Exported to {out}[/green]")
 
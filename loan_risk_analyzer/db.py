@@ -4,10 +4,13 @@ import os
 from contextlib import contextmanager
 from pathlib import Path
 
-from sqlalchemy import create_engine
+from typing import List, Optional
+
+from sqlalchemy import Engine, create_engine, inspect
 from sqlalchemy.orm import sessionmaker, Session
 
 from .models import Base
+from . import migrations
 
 
 def _default_db_path() -> Path:
@@ -22,12 +25,23 @@ def get_database_url() -> str:
 	return f"sqlite:///{_default_db_path()}"
 
 
-engine = create_engine(get_database_url(), echo=False, future=True)
+# Generous busy timeout so concurrent queue workers wait for the write lock instead of erroring.
+engine = create_engine(get_database_url(), echo=False, future=True, connect_args={"timeout": 30})
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False, future=True)
 
 
-def init_db() -> None:
-	Base.metadata.create_all(bind=engine)
+def init_db(bind: Optional[Engine] = None) -> List[migrations.Migration]:
+	"""Create missing tables, then bring an existing database up to the latest schema version.
+
+	Returns the migrations applied; a brand-new database is stamped at the latest version instead.
+	"""
+	bind = bind or engine
+	fresh = not inspect(bind).has_table("loans")
+	Base.metadata.create_all(bind=bind)
+	if fresh:
+		migrations.stamp(bind)
+		return []
+	return migrations.migrate(bind)
 
 
 @contextmanager
@@ -37,7 +37,7 @@ class GradingConfig:
 		)
 
 
-def _load_config() -> GradingConfig:
+def load_grading_config() -> GradingConfig:
 	path = Path(__file__).resolve().parents[1] / "config" / "grading.yaml"
 	if path.exists():
 		data = yaml.safe_load(path.read_text())
@@ -47,7 +47,7 @@ def _load_config() -> GradingConfig:
 
 
 def grade_and_recommend(dscr: float, ltv: float, pd: float) -> tuple[str, str]:
-	cfg = _load_config()
+	cfg = load_grading_config()
 	for rule in cfg.rules:
 		if pd <= rule.max_pd and dscr >= rule.min_dscr and ltv <= rule.max_ltv:
 			rec = "Approve"
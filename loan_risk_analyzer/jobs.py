@@ -0,0 +1,294 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, func, select, text, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, aliased, sessionmaker
+
+from .models import AssessmentJob
+from .services import assess_loan
+from . import repositories as repo
+
+logger = logging.getLogger(__name__)
+
+
+def _enqueue(session: Session, kind: str, dedupe_key: str, loan_id: Optional[int] = None, payload: Optional[str] = None, priority: int = 0, max_attempts: int = 5, parent_job_id: Optional[int] = None) -> int:
+	"""Insert a queued job unless one with the same key is already waiting; returns the waiting job's id."""
+	now = datetime.utcnow()
+	stmt = sqlite_insert(AssessmentJob).values(
+		kind=kind,
+		loan_id=loan_id,
+		payload=payload,
+		dedupe_key=dedupe_key,
+		parent_job_id=parent_job_id,
+		status="queued",
+		priority=priority,
+		attempts=0,
+		max_attempts=max_attempts,
+		available_at=now,
+		created_at=now,
+	).on_conflict_do_nothing(index_elements=[AssessmentJob.dedupe_key], index_where=AssessmentJob.status == "queued")
+	session.execute(stmt)
+	return session.execute(
+		select(AssessmentJob.job_id).where(AssessmentJob.dedupe_key == dedupe_key, AssessmentJob.status == "queued")
+	).scalar_one()
+
+
+def enqueue_loan(session: Session, loan_id: int, priority: int = 0, max_attempts: int = 5, parent_job_id: Optional[int] = None) -> int:
+	return _enqueue(session, "loan", f"loan:{loan_id}", loan_id=loan_id, priority=priority, max_attempts=max_attempts, parent_job_id=parent_job_id)
+
+
+def enqueue_loans(session: Session, loan_ids: Iterable[int], priority: int = 0, max_attempts: int = 5) -> int:
+	ids = sorted(set(int(i) for i in loan_ids))
+	digest = hashlib.sha1(",".join(map(str, ids)).encode()).hexdigest()
+	return _enqueue(session, "loan_set", f"loans:{digest}", payload=json.dumps(ids), priority=priority, max_attempts=max_attempts)
+
+
+def enqueue_portfolio(session: Session, priority: int = 0, max_attempts: int = 5) -> int:
+	return _enqueue(session, "portfolio", "portfolio", priority=priority, max_attempts=max_attempts)
+
+
+def _claim(session: Session, token: str, now: datetime, claimable, limit: int) -> int:
+	candidates = (
+		select(AssessmentJob.job_id)
+		.where(claimable)
+		.order_by(AssessmentJob.priority.desc(), AssessmentJob.job_id)
+		.limit(limit)
+		.scalar_subquery()
+	)
+	return session.execute(
+		update(AssessmentJob)
+		.where(AssessmentJob.job_id.in_(candidates), claimable)
+		.values(status="running", claimed_by=token, claimed_at=now, attempts=AssessmentJob.attempts + 1)
+		.execution_options(synchronize_session=False)
+	).rowcount
+
+
+def claim_jobs(session: Session, worker_id: str, batch_size: int = 10, lease_seconds: int = 300) -> List[AssessmentJob]:
+	"""Atomically mark up to batch_size jobs as running for this worker and return them.
+
+	Each claim is a single UPDATE tagged with a fresh token, which SQLite serializes, so no job is
+	handed to two workers without a SELECT ... FOR UPDATE. Running jobs whose lease lapsed belong to
+	a crashed worker and are reclaimed first; queued jobs fill the rest of the batch. The two are
+	separate statements so each walks ix_assessment_jobs_claim in order rather than sorting an OR.
+	"""
+	now = datetime.utcnow()
+	token = f"{worker_id}:{uuid.uuid4().hex[:12]}"
+	stale = and_(AssessmentJob.status == "running", AssessmentJob.claimed_at < now - timedelta(seconds=lease_seconds))
+	claimed = _claim(session, token, now, stale, batch_size)
+	if claimed < batch_size:
+		queued = and_(AssessmentJob.status == "queued", AssessmentJob.available_at <= now)
+		_claim(session, token, now, queued, batch_size - claimed)
+	jobs = session.execute(select(AssessmentJob).where(AssessmentJob.claimed_by == token)).scalars().all()
+	return sorted(jobs, key=lambda job: (-job.priority, job.job_id))
+
+
+def _requeue(session: Session, job_id: int, token: str, **values) -> bool:
+	"""Hand a claimed job back to the queue unless a job with the same key is already waiting.
+
+	One guarded UPDATE, since requeuing next to a waiting twin would violate
+	uq_assessment_jobs_queued_dedupe. Returns False if the job was not requeued.
+	"""
+	twin = aliased(AssessmentJob)
+	waiting = select(twin.job_id).where(twin.dedupe_key == AssessmentJob.dedupe_key, twin.status == "queued").exists()
+	return session.execute(
+		update(AssessmentJob)
+		.where(AssessmentJob.job_id == job_id, AssessmentJob.claimed_by == token, AssessmentJob.status == "running", ~waiting)
+		.values(status="queued", claimed_by=None, claimed_at=None, **values)
+		.execution_options(synchronize_session=False)
+	).rowcount == 1
+
+
+def _supersede(session: Session, job: AssessmentJob) -> None:
+	# A fresh request for the same work is already waiting; it carries the work, so this is not a failure.
+	newer = session.execute(
+		select(AssessmentJob.job_id).where(AssessmentJob.dedupe_key == job.dedupe_key, AssessmentJob.status == "queued")
+	).scalar_one_or_none()
+	job.status = "superseded"
+	job.result = json.dumps({"superseded_by": newer})
+	job.finished_at = datetime.utcnow()
+
+
+def queue_depth(session: Session) -> Dict[str, int]:
+	rows = session.execute(select(AssessmentJob.status, func.count()).group_by(AssessmentJob.status)).all()
+	depth = {status: 0 for status in ("queued", "running", "done", "failed", "superseded")}
+	depth.update({status: n for status, n in rows})
+	return depth
+
+
+def _run_job(session: Session, job: AssessmentJob) -> dict:
+	if job.kind == "loan":
+		return {"assessment_id": assess_loan(session, job.loan_id)}
+	if job.kind == "loan_set":
+		loan_ids = json.loads(job.payload or "[]")
+	elif job.kind == "portfolio":
+		loan_ids = [ln.loan_id for ln in repo.list_active_loans(session)]
+	else:
+		raise ValueError(f"Unknown job kind {job.kind!r}")
+	# Fan out so each loan commits and retries on its own.
+	for loan_id in loan_ids:
+		enqueue_loan(session, loan_id, priority=job.priority, max_attempts=job.max_attempts, parent_job_id=job.job_id)
+	return {"enqueued": len(loan_ids)}
+
+
+@dataclass
+class WorkerStats:
+	started_at: float = field(default_factory=time.monotonic)
+	succeeded: int = 0
+	failed: int = 0
+	retried: int = 0
+	superseded: int = 0
+	_lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+	def record(self, outcome: str) -> None:
+		with self._lock:
+			setattr(self, outcome, getattr(self, outcome) + 1)
+
+	@property
+	def processed(self) -> int:
+		return self.succeeded + self.failed + self.retried + self.superseded
+
+	@property
+	def throughput(self) -> float:
+		elapsed = time.monotonic() - self.started_at
+		return self.processed / elapsed if elapsed > 0 else 0.0
+
+
+class WorkerPool:
+	"""Threads that claim jobs in batches and run each one in its own transaction.
+
+	A job that raises is requeued with exponential backoff until max_attempts; ValueError means
+	the data itself is unassessable (missing loan or financials) and fails the job immediately.
+	"""
+
+	def __init__(
+		self,
+		session_factory: sessionmaker,
+		workers: int = 4,
+		batch_size: int = 10,
+		lease_seconds: int = 300,
+		poll_interval: float = 1.0,
+		backoff_base: float = 2.0,
+		backoff_max: float = 300.0,
+	) -> None:
+		self.session_factory = session_factory
+		self.workers = workers
+		self.batch_size = batch_size
+		self.lease_seconds = lease_seconds
+		self.poll_interval = poll_interval
+		self.backoff_base = backoff_base
+		self.backoff_max = backoff_max
+		self.stats = WorkerStats()
+		self._stop = threading.Event()
+
+	def stop(self) -> None:
+		self._stop.set()
+
+	def run(self, drain: bool = True, report: Optional[Callable[[Dict[str, int], WorkerStats], None]] = None, report_interval: float = 5.0) -> WorkerStats:
+		"""Run until stopped, or with drain=True until nothing is queued or running."""
+		with self.session_factory.begin() as session:
+			session.execute(text("PRAGMA journal_mode=WAL"))
+		threads = [threading.Thread(target=self._loop, args=(f"w{i}", drain), daemon=True) for i in range(self.workers)]
+		for t in threads:
+			t.start()
+		try:
+			while any(t.is_alive() for t in threads):
+				for t in threads:
+					t.join(timeout=report_interval / len(threads))
+				if report is not None:
+					with self.session_factory() as session:
+						report(queue_depth(session), self.stats)
+		except KeyboardInterrupt:
+			# Let in-flight jobs finish and hand back unstarted claims.
+			self.stop()
+			for t in threads:
+				t.join()
+		return self.stats
+
+	def _loop(self, worker_id: str, drain: bool) -> None:
+		while not self._stop.is_set():
+			try:
+				if self._round(worker_id, drain):
+					return
+			except Exception:
+				# A claim or bookkeeping transaction failed, e.g. the database stayed locked past the
+				# busy timeout. Jobs claimed this round keep their lease and are reclaimed once it lapses.
+				logger.exception("Worker %s round failed; retrying in %.1fs", worker_id, self.poll_interval)
+				self._stop.wait(self.poll_interval)
+
+	def _round(self, worker_id: str, drain: bool) -> bool:
+		"""Claim and process one batch; True when the worker should exit."""
+		with self.session_factory.begin() as session:
+			jobs = claim_jobs(session, worker_id, self.batch_size, self.lease_seconds)
+			claims = [(job.job_id, job.claimed_by) for job in jobs]
+		if not claims:
+			if drain and self._idle():
+				return True
+			self._stop.wait(self.poll_interval)
+			return False
+		for i, (job_id, token) in enumerate(claims):
+			if self._stop.is_set():
+				self._release(claims[i:])
+				return True
+			self._process(job_id, token)
+		return False
+
+	def _release(self, claims: List[tuple]) -> None:
+		"""Hand unstarted claims back to the queue rather than waiting for their lease to lapse."""
+		with self.session_factory.begin() as session:
+			for job_id, token in claims:
+				if _requeue(session, job_id, token, attempts=AssessmentJob.attempts - 1):
+					continue
+				job = session.get(AssessmentJob, job_id)
+				if job is not None and job.claimed_by == token and job.status == "running":
+					_supersede(session, job)
+
+	def _idle(self) -> bool:
+		with self.session_factory() as session:
+			depth = queue_depth(session)
+		return depth["queued"] == 0 and depth["running"] == 0
+
+	def _process(self, job_id: int, token: str) -> None:
+		try:
+			with self.session_factory.begin() as session:
+				job = session.get(AssessmentJob, job_id)
+				if job is None or job.claimed_by != token or job.status != "running":
+					return  # lease lost to another worker
+				if job.attempts > job.max_attempts:
+					raise ValueError(f"Gave up after {job.max_attempts} attempts")
+				result = _run_job(session, job)
+				job.status = "done"
+				job.result = json.dumps(result)
+				job.finished_at = datetime.utcnow()
+				job.last_error = None
+			self.stats.record("succeeded")
+		except Exception as exc:
+			self._handle_failure(job_id, token, exc)
+
+	def _handle_failure(self, job_id: int, token: str, exc: Exception) -> None:
+		with self.session_factory.begin() as session:
+			job = session.get(AssessmentJob, job_id)
+			if job is None or job.claimed_by != token:
+				return
+			job.last_error = f"{type(exc).__name__}: {exc}"
+			if isinstance(exc, ValueError) or job.attempts >= job.max_attempts:
+				job.status = "failed"
+				job.finished_at = datetime.utcnow()
+				self.stats.record("failed")
+				return
+			delay = min(self.backoff_base ** job.attempts, self.backoff_max)
+			available_at = datetime.utcnow() + timedelta(seconds=delay)
+			if _requeue(session, job_id, token, available_at=available_at, last_error=job.last_error):
+				self.stats.record("retried")
+				return
+			_supersede(session, job)
+			self.stats.record("superseded")
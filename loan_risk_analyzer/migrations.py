@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Tuple
+
+from sqlalchemy import Engine, inspect, text
+from sqlalchemy.engine import Connection
+
+
+@dataclass(frozen=True)
+class Migration:
+	version: int
+	name: str
+	statements: Tuple[str, ...]
+
+
+# Append-only. Fresh databases get the full schema from models.create_all and are stamped at the
+# latest version, so every schema change made here must also be reflected in models.py.
+MIGRATIONS: List[Migration] = [
+	Migration(
+		1,
+		"hot_query_indexes",
+		(
+			"CREATE INDEX IF NOT EXISTS ix_loans_status ON loans (status)",
+			"CREATE INDEX IF NOT EXISTS ix_loans_borrower_id ON loans (borrower_id)",
+			"CREATE INDEX IF NOT EXISTS ix_collateral_borrower_id ON collateral (borrower_id)",
+			"CREATE INDEX IF NOT EXISTS ix_loan_collateral_collateral_id ON loan_collateral (collateral_id)",
+			"CREATE INDEX IF NOT EXISTS ix_risk_assessments_loan_asof ON risk_assessments (loan_id, as_of_date, assessment_id)",
+			"ANALYZE",
+		),
+	),
+	Migration(
+		2,
+		"job_claim_index_order",
+		(
+			"DROP INDEX IF EXISTS ix_assessment_jobs_claim",
+			"CREATE INDEX ix_assessment_jobs_claim ON assessment_jobs (status, priority DESC, job_id)",
+		),
+	),
+]
+
+_VERSION_TABLE = "schema_migrations"
+
+
+def latest_version() -> int:
+	return MIGRATIONS[-1].version if MIGRATIONS else 0
+
+
+def _ensure_version_table(conn: Connection) -> None:
+	conn.execute(text(
+		f"CREATE TABLE IF NOT EXISTS {_VERSION_TABLE} ("
+		"version INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, applied_at DATETIME NOT NULL)"
+	))
+
+
+def current_version(conn: Connection) -> int:
+	if not inspect(conn).has_table(_VERSION_TABLE):
+		return 0
+	return conn.execute(text(f"SELECT COALESCE(MAX(version), 0) FROM {_VERSION_TABLE}")).scalar_one()
+
+
+def _record(conn: Connection, migration: Migration) -> None:
+	conn.execute(
+		text(f"INSERT INTO {_VERSION_TABLE} (version, name, applied_at) VALUES (:v, :n, :t)"),
+		{"v": migration.version, "n": migration.name, "t": datetime.utcnow()},
+	)
+
+
+def stamp(engine: Engine) -> None:
+	"""Mark every migration as applied; used for databases just built from the current models."""
+	with engine.begin() as conn:
+		_ensure_version_table(conn)
+		applied = current_version(conn)
+		for migration in MIGRATIONS:
+			if migration.version > applied:
+				_record(conn, migration)
+
+
+def migrate(engine: Engine) -> List[Migration]:
+	"""Apply pending migrations in order, each in its own transaction. Returns those applied."""
+	with engine.begin() as conn:
+		_ensure_version_table(conn)
+	applied: List[Migration] = []
+	for migration in MIGRATIONS:
+		with engine.begin() as conn:
+			if migration.version <= current_version(conn):
+				continue
+			for stmt in migration.statements:
+				conn.execute(text(stmt))
+			_record(conn, migration)
+		applied.append(migration)
+	return applied
@@ -1,9 +1,10 @@
 from __future__ import annotations
 
 from datetime import date, datetime
+from enum import Enum
 from typing import List, Optional
 
-from sqlalchemy import String, Date, DateTime, Float, Integer, ForeignKey, Text, UniqueConstraint
+from sqlalchemy import Boolean, String, Date, DateTime, Float, Integer, ForeignKey, Index, Text, UniqueConstraint, text
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 
@@ -42,6 +43,12 @@ class Loan(Base):
 	borrower: Mapped[Borrower] = relationship(back_populates="loans")
 	assessments: Mapped[List["RiskAssessment"]] = relationship(back_populates="loan", cascade="all, delete-orphan")
 	pledges: Mapped[List["LoanCollateral"]] = relationship(back_populates="loan", cascade="all, delete-orphan")
+	outcome: Mapped[Optional["LoanOutcome"]] = relationship(back_populates="loan", cascade="all, delete-orphan", uselist=False)
+
+	__table_args__ = (
+		Index("ix_loans_status", "status"),
+		Index("ix_loans_borrower_id", "borrower_id"),
+	)
 
 
 class Financials(Base):
@@ -79,6 +86,10 @@ class Collateral(Base):
 	borrower: Mapped[Borrower] = relationship(back_populates="collateral")
 	pledges: Mapped[List["LoanCollateral"]] = relationship(back_populates="collateral", cascade="all, delete-orphan")
 
+	__table_args__ = (
+		Index("ix_collateral_borrower_id", "borrower_id"),
+	)
+
 
 class LoanCollateral(Base):
 	__tablename__ = "loan_collateral"
@@ -90,6 +101,10 @@ class LoanCollateral(Base):
 	loan: Mapped[Loan] = relationship(back_populates="pledges")
 	collateral: Mapped[Collateral] = relationship(back_populates="pledges")
 
+	__table_args__ = (
+		Index("ix_loan_collateral_collateral_id", "collateral_id"),
+	)
+
 
 class RiskAssessment(Base):
 	__tablename__ = "risk_assessments"
@@ -107,3 +122,90 @@ class RiskAssessment(Base):
 	config_version: Mapped[Optional[str]] = mapped_column(String(100))
 
 	loan: Mapped[Loan] = relationship(back_populates="assessments")
+
+	__table_args__ = (
+		Index("ix_risk_assessments_loan_asof", "loan_id", "as_of_date", "assessment_id"),
+	)
+
+
+class OutcomeType(str, Enum):
+	default = "default"
+	charged_off = "charged_off"
+	repaid = "repaid"
+	matured = "matured"
+
+
+DEFAULT_OUTCOMES = frozenset({OutcomeType.default, OutcomeType.charged_off})
+
+
+class LoanOutcome(Base):
+	__tablename__ = "loan_outcomes"
+
+	outcome_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+	loan_id: Mapped[int] = mapped_column(ForeignKey("loans.loan_id"), unique=True, nullable=False)
+	outcome_date: Mapped[date] = mapped_column(Date, nullable=False)
+	outcome_type: Mapped[str] = mapped_column(String(30), nullable=False)  # OutcomeType value
+	defaulted: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+	notes: Mapped[Optional[str]] = mapped_column(Text)
+	recorded_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+
+	loan: Mapped[Loan] = relationship(back_populates="outcome")
+
+
+class WatchlistAlert(Base):
+	__tablename__ = "watchlist_alerts"
+
+	alert_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+	scan_id: Mapped[int] = mapped_column(ForeignKey("watchlist_scans.scan_id"), nullable=False)
+	loan_id: Mapped[int] = mapped_column(ForeignKey("loans.loan_id"), nullable=False)
+	assessment_id: Mapped[int] = mapped_column(ForeignKey("risk_assessments.assessment_id"), nullable=False)
+	baseline_assessment_id: Mapped[Optional[int]] = mapped_column(ForeignKey("risk_assessments.assessment_id"))
+	rule: Mapped[str] = mapped_column(String(50), nullable=False)
+	severity: Mapped[str] = mapped_column(String(20), nullable=False)
+	message: Mapped[str] = mapped_column(Text, nullable=False)
+	created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+
+	__table_args__ = (
+		UniqueConstraint("assessment_id", "rule", name="uq_watchlist_alert_assessment_rule"),
+	)
+
+
+class WatchlistScan(Base):
+	__tablename__ = "watchlist_scans"
+
+	scan_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+	scanned_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+	from_assessment_id: Mapped[int] = mapped_column(Integer, nullable=False)  # exclusive
+	to_assessment_id: Mapped[int] = mapped_column(Integer, nullable=False)  # inclusive high-water mark
+	baseline_date: Mapped[Optional[date]] = mapped_column(Date)
+	alerts_emitted: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class AssessmentJob(Base):
+	__tablename__ = "assessment_jobs"
+
+	job_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+	kind: Mapped[str] = mapped_column(String(20), nullable=False)  # "loan", "loan_set" or "portfolio"
+	loan_id: Mapped[Optional[int]] = mapped_column(ForeignKey("loans.loan_id"))
+	payload: Mapped[Optional[str]] = mapped_column(Text)  # JSON loan ids for loan_set
+	dedupe_key: Mapped[str] = mapped_column(String(100), nullable=False)
+	parent_job_id: Mapped[Optional[int]] = mapped_column(ForeignKey("assessment_jobs.job_id"))
+	status: Mapped[str] = mapped_column(String(20), nullable=False, default="queued")  # queued, running, done, failed, superseded
+	priority: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+	attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+	max_attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=5)
+	available_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+	claimed_by: Mapped[Optional[str]] = mapped_column(String(100))
+	claimed_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+	created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+	finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+	last_error: Mapped[Optional[str]] = mapped_column(Text)
+	result: Mapped[Optional[str]] = mapped_column(Text)
+
+	__table_args__ = (
+		# Matches the claim ORDER BY, so claiming walks the index instead of sorting the queue.
+		Index("ix_assessment_jobs_claim", "status", text("priority DESC"), "job_id"),
+		Index("ix_assessment_jobs_claimed_by", "claimed_by"),
+		# At most one waiting job per key; repeated requests collapse onto it.
+		Index("uq_assessment_jobs_queued_dedupe", "dedupe_key", unique=True, sqlite_where=text("status = 'queued'")),
+	)
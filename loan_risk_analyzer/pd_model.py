@@ -2,9 +2,11 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, Optional
 
 import math
+import os
+import numpy as np
 import yaml
 
 
@@ -15,6 +17,7 @@ class PDConfig:
 	beta_ltv: float = 1.5
 	beta_coverage: float = -0.8
 	version: str = "default"
+	calibration: Optional[Dict[str, Any]] = None  # fit statistics written by calibrate-pd
 
 
 class PDModel:
@@ -25,7 +28,8 @@ class PDModel:
 		if config_path and config_path.exists():
 			data = yaml.safe_load(config_path.read_text())
 			return PDConfig(**data)
-		default_path = Path(__file__).resolve().parents[1] / "config" / "pd.yaml"
+		env_path = os.environ.get("LOANS_PD_CONFIG")
+		default_path = Path(env_path) if env_path else Path(__file__).resolve().parents[1] / "config" / "pd.yaml"
 		if default_path.exists():
 			data = yaml.safe_load(default_path.read_text())
 			return PDConfig(**data)
@@ -47,3 +51,15 @@ class PDModel:
 			+ self.config.beta_coverage * features["coverage"]
 		)
 		return 1.0 / (1.0 + math.exp(-lin))
+
+	def predict_array(self, dscr: np.ndarray, ltv: np.ndarray, coverage: np.ndarray) -> np.ndarray:
+		"""Vectorized `predict` over equally shaped arrays."""
+		feats = [np.asarray(x, dtype=float) for x in (dscr, ltv, coverage)]
+		feats = [np.where(np.isfinite(x), x, 0.0) for x in feats]
+		lin = (
+			self.config.intercept
+			+ self.config.beta_dscr * feats[0]
+			+ self.config.beta_ltv * feats[1]
+			+ self.config.beta_coverage * feats[2]
+		)
+		return 1.0 / (1.0 + np.exp(-lin))
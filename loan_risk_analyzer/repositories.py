@@ -1,21 +1,114 @@
 from __future__ import annotations
 
 from datetime import date
-from typing import Optional, Tuple
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
 
-from sqlalchemy import select, func
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, event, inspect, select, func
+from sqlalchemy.orm import Session, make_transient_to_detached
 
-from .models import Borrower, Loan, Financials, Collateral, LoanCollateral, RiskAssessment
+from .cache import MISSING, CacheStats, repo_cache
+from .models import Borrower, Loan, Financials, Collateral, LoanCollateral, RiskAssessment, LoanOutcome, OutcomeType, DEFAULT_OUTCOMES
+
+# Read-through cache for hot single-row lookups. Values are column snapshots (never live ORM
+# instances) keyed by engine, so a hit is re-attached to the caller's session without a SELECT;
+# an instance already in the session's identity map is returned as is, keeping unflushed edits.
+# Repository writes invalidate their keys immediately and again at commit, and a fill is dropped
+# if its key was invalidated while it was loading. A session holding uncommitted repository writes
+# never fills the cache and bypasses it for the keys it wrote, so rolled-back rows are never cached.
+# Writes the cache cannot see (other processes, raw SQL) are caught by PRAGMA data_version, which
+# changes on a connection whenever another connection commits; any change clears the cache.
+_WRITTEN_KEYS = "repo_cache_written_keys"
+_DATA_VERSION = "repo_cache_data_version"
+
+
+def _cache_key(session: Session, kind: str, ident: Hashable) -> Tuple[Any, str, Hashable]:
+	return (session.get_bind(), kind, ident)
+
+
+def _snapshot(obj: Any) -> Optional[Tuple[type, Dict[str, Any]]]:
+	if obj is None:
+		return None
+	return type(obj), {attr.key: getattr(obj, attr.key) for attr in inspect(obj).mapper.column_attrs}
+
+
+def _restore(session: Session, snap: Optional[Tuple[type, Dict[str, Any]]]) -> Any:
+	if snap is None:
+		return None
+	cls, values = snap
+	mapper = inspect(cls)
+	ident = mapper.identity_key_from_primary_key([values[col.key] for col in mapper.primary_key])
+	current = session.identity_map.get(ident)
+	if current is not None:
+		return current
+	obj = cls(**values)
+	make_transient_to_detached(obj)
+	return session.merge(obj, load=False)
+
+
+def _check_data_version(session: Session) -> None:
+	"""Clear the cache if another connection, in this process or another, committed since this one last looked.
+
+	data_version is per connection, so each pooled connection keeps the last value it saw; a
+	connection with no recorded value cannot vouch for the cache and clears it too.
+	"""
+	if repo_cache.maxsize <= 0:
+		return
+	conn = session.connection()
+	version = conn.exec_driver_sql("PRAGMA data_version").scalar_one()
+	info = conn.connection.info
+	if info.get(_DATA_VERSION) != version:
+		info[_DATA_VERSION] = version
+		repo_cache.clear()
+
+
+def _cache_get(session: Session, key: Hashable) -> Tuple[Any, int]:
+	"""Cached value or MISSING, plus the key's generation captured before the caller's SELECT."""
+	_check_data_version(session)
+	generation = repo_cache.generation(key)
+	if key in session.info.get(_WRITTEN_KEYS, ()):
+		return MISSING, generation
+	return repo_cache.get(key), generation
+
+
+def _cache_put(session: Session, key: Hashable, value: Any, generation: int) -> None:
+	if not session.info.get(_WRITTEN_KEYS):
+		repo_cache.put(key, value, generation)
+
+
+def _invalidate(session: Session, key: Hashable) -> None:
+	repo_cache.invalidate(key)
+	session.info.setdefault(_WRITTEN_KEYS, set()).add(key)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_keys(session: Session) -> None:
+	# Another session may have refilled a key from pre-commit data in the meantime.
+	for key in session.info.pop(_WRITTEN_KEYS, ()):
+		repo_cache.invalidate(key)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_written_keys(session: Session) -> None:
+	session.info.pop(_WRITTEN_KEYS, None)
+
+
+def cache_stats() -> CacheStats:
+	return repo_cache.stats()
 
 
 def get_or_create_borrower(session: Session, name: str, industry: Optional[str], state: Optional[str], size_band: Optional[str]) -> Borrower:
+	key = _cache_key(session, "borrower_by_name", name)
+	snap, generation = _cache_get(session, key)
+	if snap is not MISSING and snap is not None:
+		return _restore(session, snap)
 	borrower = session.execute(select(Borrower).where(Borrower.name == name)).scalar_one_or_none()
 	if borrower:
+		_cache_put(session, key, _snapshot(borrower), generation)
 		return borrower
 	borrower = Borrower(name=name, industry=industry, state=state, size_band=size_band)
 	session.add(borrower)
 	session.flush()
+	_invalidate(session, key)
 	return borrower
 
 
@@ -32,10 +125,12 @@ def create_loan(session: Session, borrower_id: int, amount: float, interest_rate
 	)
 	session.add(loan)
 	session.flush()
+	_invalidate(session, _cache_key(session, "loan", loan.loan_id))
 	return loan
 
 
 def upsert_financials(session: Session, borrower_id: int, period_start: date, period_end: date, **kwargs) -> Financials:
+	_invalidate(session, _cache_key(session, "latest_financials", borrower_id))
 	row = session.execute(
 		select(Financials).where(Financials.borrower_id == borrower_id, Financials.period_end == period_end)
 	).scalar_one_or_none()
@@ -66,11 +161,18 @@ def link_loan_collateral(session: Session, loan_id: int, collateral_id: int, ple
 	link = LoanCollateral(loan_id=loan_id, collateral_id=collateral_id, pledged_value_override=pledged_value_override)
 	session.add(link)
 	session.flush()
+	_invalidate(session, _cache_key(session, "collateral_totals", loan_id))
 	return link
 
 
 def get_loan(session: Session, loan_id: int) -> Optional[Loan]:
-	return session.get(Loan, loan_id)
+	key = _cache_key(session, "loan", loan_id)
+	snap, generation = _cache_get(session, key)
+	if snap is not MISSING:
+		return _restore(session, snap)
+	loan = session.get(Loan, loan_id)
+	_cache_put(session, key, _snapshot(loan), generation)
+	return loan
 
 
 def list_active_loans(session: Session):
@@ -78,12 +180,22 @@ def list_active_loans(session: Session):
 
 
 def latest_financials_for_borrower(session: Session, borrower_id: int) -> Optional[Financials]:
-	return session.execute(
+	key = _cache_key(session, "latest_financials", borrower_id)
+	snap, generation = _cache_get(session, key)
+	if snap is not MISSING:
+		return _restore(session, snap)
+	row = session.execute(
 		select(Financials).where(Financials.borrower_id == borrower_id).order_by(Financials.period_end.desc()).limit(1)
 	).scalar_one_or_none()
+	_cache_put(session, key, _snapshot(row), generation)
+	return row
 
 
 def total_collateral_values_for_loan(session: Session, loan_id: int) -> Tuple[float, float]:
+	key = _cache_key(session, "collateral_totals", loan_id)
+	totals, generation = _cache_get(session, key)
+	if totals is not MISSING:
+		return totals
 	rows = session.execute(
 		select(Collateral.appraised_value, Collateral.haircut_pct, LoanCollateral.pledged_value_override)
 		.join(LoanCollateral, LoanCollateral.collateral_id == Collateral.collateral_id)
@@ -98,6 +210,7 @@ def total_collateral_values_for_loan(session: Session, loan_id: int) -> Tuple[fl
 			adj = appraised_value * (1.0 - haircut_pct)
 		appraised_total += appraised_value
 		haircut_total += adj
+	_cache_put(session, key, (appraised_total, haircut_total), generation)
 	return appraised_total, haircut_total
 
 
@@ -126,3 +239,84 @@ def latest_assessment_for_loan(session: Session, loan_id: int) -> Optional[RiskA
 		.order_by(RiskAssessment.as_of_date.desc(), RiskAssessment.assessment_id.desc())
 		.limit(1)
 	).scalar_one_or_none()
+
+
+def record_loan_outcome(session: Session, loan_id: int, outcome_date: date, outcome_type: OutcomeType | str, defaulted: Optional[bool] = None, notes: Optional[str] = None) -> LoanOutcome:
+	"""Record a loan's terminal outcome; defaulted is derived from the outcome type unless given."""
+	outcome = OutcomeType(outcome_type)  # ValueError for unknown types
+	if defaulted is None:
+		defaulted = outcome in DEFAULT_OUTCOMES
+	loan = session.get(Loan, loan_id)
+	if loan is None:
+		raise ValueError(f"Loan {loan_id} not found")
+	row = session.execute(select(LoanOutcome).where(LoanOutcome.loan_id == loan_id)).scalar_one_or_none()
+	if row is None:
+		row = LoanOutcome(loan_id=loan_id, outcome_date=outcome_date, outcome_type=outcome.value, defaulted=defaulted, notes=notes)
+		session.add(row)
+	else:
+		row.outcome_date = outcome_date
+		row.outcome_type = outcome.value
+		row.defaulted = defaulted
+		row.notes = notes
+	loan.status = "defaulted" if defaulted else "closed"
+	session.flush()
+	_invalidate(session, _cache_key(session, "loan", loan_id))
+	return row
+
+
+def underwriting_inputs_for_active_loans(session: Session, loan_ids: Optional[Iterable[int]] = None):
+	"""One row per active loan with latest financials and pledged collateral totals, for set-based metrics.
+
+	With loan_ids the filter is pushed into the financials window and collateral aggregate, so a
+	single-loan call touches only that loan's rows instead of materializing the whole book.
+	"""
+	ids = list(loan_ids) if loan_ids is not None else None
+	fin = select(
+		Financials.borrower_id,
+		Financials.revenue,
+		Financials.operating_expenses,
+		Financials.other_income,
+		Financials.taxes,
+		Financials.capex,
+		Financials.depreciation_amortization,
+		func.row_number().over(partition_by=Financials.borrower_id, order_by=Financials.period_end.desc()).label("rn"),
+	)
+	if ids is not None:
+		fin = fin.where(Financials.borrower_id.in_(select(Loan.borrower_id).where(Loan.loan_id.in_(ids))))
+	fin = fin.subquery()
+	adjusted = func.coalesce(LoanCollateral.pledged_value_override, Collateral.appraised_value * (1.0 - Collateral.haircut_pct))
+	col = (
+		select(
+			LoanCollateral.loan_id,
+			func.sum(Collateral.appraised_value).label("appraised_total"),
+			func.sum(adjusted).label("haircut_total"),
+		)
+		.join(Collateral, Collateral.collateral_id == LoanCollateral.collateral_id)
+		.group_by(LoanCollateral.loan_id)
+	)
+	if ids is not None:
+		col = col.where(LoanCollateral.loan_id.in_(ids))
+	col = col.subquery()
+	stmt = (
+		select(
+			Loan.loan_id,
+			Loan.amount,
+			Loan.interest_rate,
+			Loan.amortization_months,
+			fin.c.revenue,
+			fin.c.operating_expenses,
+			fin.c.other_income,
+			fin.c.taxes,
+			fin.c.capex,
+			fin.c.depreciation_amortization,
+			func.coalesce(col.c.appraised_total, 0.0),
+			func.coalesce(col.c.haircut_total, 0.0),
+		)
+		.join(fin, and_(fin.c.borrower_id == Loan.borrower_id, fin.c.rn == 1))
+		.outerjoin(col, col.c.loan_id == Loan.loan_id)
+		.where(Loan.status == "active")
+		.order_by(Loan.loan_id)
+	)
+	if ids is not None:
+		stmt = stmt.where(Loan.loan_id.in_(ids))
+	return session.execute(stmt).all()
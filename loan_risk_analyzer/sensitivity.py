@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from .grading import GradingConfig, load_grading_config
+from .pd_model import PDModel
+from . import repositories as repo
+
+SENSITIVITY_COLUMNS = (
+	"noi_breakeven",
+	"noi_cushion_pct",
+	"max_rate",
+	"rate_cushion_bps",
+	"collateral_breakeven",
+	"collateral_cushion_pct",
+	"collateral_cushion_grade_pct",
+)
+
+
+@dataclass
+class BookInputs:
+	"""Column arrays for a set of loans; amortization_months is 0 for interest-only."""
+
+	loan_id: np.ndarray
+	amount: np.ndarray
+	interest_rate: np.ndarray
+	amortization_months: np.ndarray
+	noi: np.ndarray
+	appraised_total: np.ndarray
+	haircut_total: np.ndarray
+
+	def __len__(self) -> int:
+		return len(self.loan_id)
+
+
+def load_book_inputs(session: Session, loan_ids: Optional[Iterable[int]] = None) -> BookInputs:
+	rows = repo.underwriting_inputs_for_active_loans(session, loan_ids)
+	arr = np.array(rows, dtype=float).reshape(len(rows), 12)
+	arr[:, 3] = np.nan_to_num(arr[:, 3], nan=0.0)
+	revenue, opex, other, taxes, capex, da = (np.nan_to_num(arr[:, i]) for i in range(4, 10))
+	# Same as calculations.compute_noi with add_back_da=True.
+	noi = np.maximum(revenue - opex + other - taxes - capex + da, 0.0)
+	return BookInputs(
+		loan_id=arr[:, 0].astype(np.int64),
+		amount=arr[:, 1],
+		interest_rate=arr[:, 2],
+		amortization_months=arr[:, 3],
+		noi=noi,
+		appraised_total=arr[:, 10],
+		haircut_total=arr[:, 11],
+	)
+
+
+def _monthly_payment(principal: np.ndarray, monthly_rate: np.ndarray, months: np.ndarray) -> np.ndarray:
+	"""Vectorized calculations.amortization_payment on a monthly rate; months == 0 means interest-only."""
+	io = months <= 0
+	safe_months = np.where(io, 1.0, months)
+	growth = np.expm1(safe_months * np.log1p(monthly_rate))
+	with np.errstate(divide="ignore", invalid="ignore"):
+		amort = np.where(
+			monthly_rate == 0,
+			principal / safe_months,
+			principal * monthly_rate * (growth + 1.0) / growth,
+		)
+	return np.where(io, principal * monthly_rate, amort)
+
+
+def annual_debt_service(principal: np.ndarray, annual_rate: np.ndarray, amortization_months: np.ndarray) -> np.ndarray:
+	return _monthly_payment(principal, annual_rate / 12.0, amortization_months) * 12.0
+
+
+def max_rate_for_debt_service(principal: np.ndarray, max_annual_debt_service: np.ndarray, amortization_months: np.ndarray, tol: float = 1e-12, max_iter: int = 60) -> np.ndarray:
+	"""Annual rate at which debt service equals the given ceiling; NaN when even a zero rate exceeds it.
+
+	Interest-only loans are closed form. Amortizing loans use Newton on the payment formula for all loans
+	at once, started from the interest-only rate: the payment is increasing and convex in the rate and
+	always above the interest-only payment, so the iterates decrease monotonically onto the root.
+	"""
+	principal = np.asarray(principal, dtype=float)
+	months = np.asarray(amortization_months, dtype=float)
+	target = np.asarray(max_annual_debt_service, dtype=float) / 12.0
+	with np.errstate(divide="ignore", invalid="ignore"):
+		io_rate = np.where(principal > 0, target / principal, np.inf)
+	out = np.where(months <= 0, io_rate * 12.0, np.nan)
+
+	amort = (months > 0) & (principal > 0)
+	solvable = amort & (target > principal / np.where(amort, months, 1.0))
+	if not solvable.any():
+		return out
+	p, n, t = principal[solvable], months[solvable], target[solvable]
+	i = t / p
+	for _ in range(max_iter):
+		growth = np.expm1(n * np.log1p(i))
+		factor = growth + 1.0
+		g = p * i * factor / growth - t
+		dfactor = n * factor / (1.0 + i)
+		dg = p * (factor / growth - i * dfactor / growth ** 2)
+		step = g / dg
+		i = i - step
+		if np.max(np.abs(step)) < tol:
+			break
+	out[solvable] = i * 12.0
+	return out
+
+
+def _pd_collateral_cushion(c0: np.ndarray, ltv: np.ndarray, coverage: np.ndarray, beta_ltv: float, beta_cov: float, logit_max_pd: float) -> np.ndarray:
+	"""Collateral decline x at which PD first reaches max_pd.
+
+	With s = 1 - x, LTV scales by 1/s and coverage by s, so the PD boundary
+	beta_ltv*ltv/s + beta_cov*coverage*s + c0 = logit(max_pd) is the quadratic
+	a*s^2 + b*s + c = 0; the largest root in (0, 1) is the first crossing. No root means no crossing.
+	"""
+	a = beta_cov * coverage
+	b = c0 - logit_max_pd
+	c = beta_ltv * ltv
+	with np.errstate(divide="ignore", invalid="ignore"):
+		sq = np.sqrt(np.maximum(b * b - 4.0 * a * c, 0.0))
+		real = b * b - 4.0 * a * c >= 0
+		r1 = np.where(a != 0, (-b + sq) / (2.0 * a), -c / b)
+		r2 = np.where(a != 0, (-b - sq) / (2.0 * a), -c / b)
+	r1 = np.where(real & (r1 > 0) & (r1 < 1), r1, -np.inf)
+	r2 = np.where(real & (r2 > 0) & (r2 < 1), r2, -np.inf)
+	s = np.maximum(r1, r2)
+	return np.where(np.isfinite(s), 1.0 - s, 1.0)
+
+
+def compute_sensitivities(inputs: BookInputs, pd_model: Optional[PDModel] = None, grading: Optional[GradingConfig] = None) -> Dict[str, np.ndarray]:
+	"""Breakeven NOI, rate and collateral values against the hard guardrails and the current grade rule."""
+	pd_model = pd_model or PDModel()
+	cfg = grading or load_grading_config()
+	amount = inputs.amount
+	noi = inputs.noi
+
+	ads = annual_debt_service(amount, inputs.interest_rate, inputs.amortization_months)
+	with np.errstate(divide="ignore", invalid="ignore"):
+		dscr = np.where(ads > 0, noi / ads, np.inf)
+		ltv = np.where(inputs.appraised_total > 0, amount / inputs.appraised_total, np.inf)
+		coverage = np.where(amount > 0, inputs.haircut_total / amount, np.inf)
+	pd = pd_model.predict_array(dscr, ltv, coverage)
+
+	# Current grade rule per loan, mirroring grading.grade_and_recommend: index into cfg.rules,
+	# len(rules) for the "Approve with conditions" fallback and -1 for the guardrail decline.
+	rule_idx = np.full(len(inputs), len(cfg.rules), dtype=np.int64)
+	unassigned = np.ones(len(inputs), dtype=bool)
+	for k, rule in enumerate(cfg.rules):
+		hit = unassigned & (pd <= rule.max_pd) & (dscr >= rule.min_dscr) & (ltv <= rule.max_ltv)
+		rule_idx[hit] = k
+		unassigned &= ~hit
+	declined = unassigned & ((dscr < cfg.min_dscr_hard) | (ltv > cfg.max_ltv_hard))
+	rule_idx[declined] = -1
+
+	noi_breakeven = cfg.min_dscr_hard * ads
+	with np.errstate(divide="ignore", invalid="ignore"):
+		noi_cushion = np.where(noi > 0, 1.0 - noi_breakeven / noi, np.nan)
+	max_rate = max_rate_for_debt_service(amount, noi / cfg.min_dscr_hard, inputs.amortization_months)
+
+	has_collateral = inputs.appraised_total > 0
+	collateral_breakeven = amount / cfg.max_ltv_hard
+	with np.errstate(divide="ignore", invalid="ignore"):
+		ltv_cushion = np.where(has_collateral, 1.0 - ltv / cfg.max_ltv_hard, np.nan)
+
+	dscr_feat = np.where(np.isfinite(dscr), dscr, 0.0)
+	c0 = pd_model.config.intercept + pd_model.config.beta_dscr * dscr_feat
+	grade_cushion = np.where(rule_idx == len(cfg.rules), ltv_cushion, 0.0)
+	for k, rule in enumerate(cfg.rules):
+		m = (rule_idx == k) & has_collateral
+		if not m.any():
+			continue
+		x_ltv = 1.0 - ltv[m] / rule.max_ltv
+		logit_max_pd = float(np.log(rule.max_pd / (1.0 - rule.max_pd)))
+		x_pd = _pd_collateral_cushion(c0[m], ltv[m], coverage[m], pd_model.config.beta_ltv, pd_model.config.beta_coverage, logit_max_pd)
+		grade_cushion[m] = np.minimum(x_ltv, x_pd)
+	grade_cushion = np.where(has_collateral, np.maximum(grade_cushion, 0.0), np.nan)
+
+	return {
+		"loan_id": inputs.loan_id,
+		"dscr": dscr,
+		"ltv": ltv,
+		"coverage": coverage,
+		"pd": pd,
+		"noi": noi,
+		"noi_breakeven": noi_breakeven,
+		"noi_cushion_pct": noi_cushion,
+		"max_rate": max_rate,
+		"rate_cushion_bps": (max_rate - inputs.interest_rate) * 1e4,
+		"collateral_breakeven": collateral_breakeven,
+		"collateral_cushion_pct": ltv_cushion,
+		"collateral_cushion_grade_pct": grade_cushion,
+	}
+
+
+def sensitivities_for_loans(session: Session, loan_ids: Optional[Iterable[int]] = None) -> Dict[str, np.ndarray]:
+	return compute_sensitivities(load_book_inputs(session, loan_ids))
+
+
+def sensitivity_records(result: Dict[str, np.ndarray]) -> List[Dict[str, float]]:
+	keys = list(result.keys())
+	cols = [result[k].tolist() for k in keys]
+	return [dict(zip(keys, values)) for values in zip(*cols)]
@@ -34,7 +34,8 @@ def assess_loan(session: Session, loan_id: int, as_of: date | None = None, notes
 	appraised_total, haircut_total = repo.total_collateral_values_for_loan(session, loan.loan_id)
 	ltv = compute_ltv(loan.amount, appraised_total)
 	coverage = compute_collateral_coverage(haircut_total, loan.amount)
-	pd = PDModel().predict(dscr, ltv, coverage)
+	pd_model = PDModel()
+	pd = pd_model.predict(dscr, ltv, coverage)
 	grade, rec = grade_and_recommend(dscr, ltv, pd)
 	ra = repo.record_assessment(
 		session,
@@ -47,6 +48,6 @@ def assess_loan(session: Session, loan_id: int, as_of: date | None = None, notes
 		grade=grade,
 		recommendation=rec,
 		notes=notes,
-		config_version="default",
+		config_version=pd_model.config.version,
 	)
 	return ra.assessment_id
@@ -9,7 +9,8 @@ import streamlit as st
 
 from loan_risk_analyzer.db import init_db, get_session
 from loan_risk_analyzer import repositories as repo
-from loan_risk_analyzer.services import assess_loan
+from loan_risk_analyzer.jobs import enqueue_loan
+from loan_risk_analyzer.sensitivity import sensitivities_for_loans, sensitivity_records
 
 st.set_page_config(page_title="Commercial Loan Risk Analyzer", layout="wide")
 
@@ -46,7 +47,7 @@ with tabs[0]:
 			appraised_value = st.number_input("Appraised Value", min_value=0.0, value=3_000_000.0, step=10000.0)
 		with coly:
 			haircut_pct = st.number_input("Haircut (decimal)", min_value=0.0, max_value=1.0, value=0.2, step=0.05)
-		submitted = st.form_submit_button("Create Deal & Assess")
+		submitted = st.form_submit_button("Create Deal & Queue Assessment")
 	if submitted:
 		with get_session() as session:
 			b = repo.get_or_create_borrower(session, name, industry, state, size_band)
@@ -56,8 +57,8 @@ with tabs[0]:
 			repo.upsert_financials(session, b.borrower_id, period_start=period_start, period_end=period_end, revenue=revenue, operating_expenses=operating_expenses, other_income=other_income, taxes=taxes, capex=capex, depreciation_amortization=depreciation_amortization)
 			col = repo.add_collateral(session, b.borrower_id, collateral_type, appraised_value, date.today(), haircut_pct)
 			repo.link_loan_collateral(session, loan.loan_id, col.collateral_id)
-			ra_id = assess_loan(session, loan.loan_id)
-			st.success(f"Created and assessed loan {loan.loan_id} (assessment {ra_id}).")
+			job_id = enqueue_loan(session, loan.loan_id, priority=1)
+			st.success(f"Created loan {loan.loan_id}; assessment job {job_id} queued. Run `python -m loan_risk_analyzer.cli worker` to process it.")
 
 with tabs[1]:
 	st.subheader("Loan Detail")
@@ -78,6 +79,15 @@ with tabs[1]:
 				st.write(ra.recommendation)
 			else:
 				st.info("No assessment yet for selected loan.")
+			sens = sensitivity_records(sensitivities_for_loans(session, [ln.loan_id]))
+			if sens:
+				s = sens[0]
+				st.markdown("**Sensitivity**")
+				s1, s2, s3, s4 = st.columns(4)
+				s1.metric("NOI Cushion", f"{s['noi_cushion_pct']:.1%}", help=f"NOI can fall to {s['noi_breakeven']:,.0f} before breaching the hard DSCR floor")
+				s2.metric("Max Rate", f"{s['max_rate']:.2%}", f"{s['rate_cushion_bps']:,.0f} bps")
+				s3.metric("Collateral Cushion (LTV)", f"{s['collateral_cushion_pct']:.1%}", help=f"Collateral can fall to {s['collateral_breakeven']:,.0f} before breaching the hard LTV cap")
+				s4.metric("Collateral Cushion (Grade)", f"{s['collateral_cushion_grade_pct']:.1%}")
 		else:
 			st.info("No active loans.")
 
@@ -110,3 +120,9 @@ with tabs[2]:
 			st.dataframe(df)
 		else:
 			st.info("Assess loans to populate dashboard.")
+
+with st.sidebar:
+	st.subheader("Lookup Cache")
+	stats = repo.cache_stats()
+	st.metric("Hit Rate", f"{stats.hit_rate:.1%}")
+	st.caption(f"{stats.size:,}/{stats.maxsize:,} entries · {stats.hits:,} hits · {stats.misses:,} misses · {stats.evictions:,} evictions · {stats.invalidations:,} invalidations")
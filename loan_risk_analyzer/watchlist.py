@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import json
+from dataclasses import asdict, dataclass, field
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import yaml
+from sqlalchemy import Select, and_, case, false, func, or_, select
+from sqlalchemy.orm import Session
+
+from .grading import load_grading_config
+from .models import RiskAssessment, WatchlistAlert, WatchlistScan
+
+RULES = ("grade_downgrade", "dscr_below_floor", "decline")
+
+
+@dataclass
+class WatchlistConfig:
+	dscr_floor: Optional[float] = 1.25  # None disables the rule
+	min_grade_notches: int = 1  # 0 disables the rule
+	decline_flip: bool = True
+	severity: Dict[str, str] = field(default_factory=lambda: {"grade_downgrade": "medium", "dscr_below_floor": "high", "decline": "high"})
+	version: str = "default"
+
+
+def load_watchlist_config(config_path: Optional[Path] = None) -> WatchlistConfig:
+	path = config_path or Path(__file__).resolve().parents[1] / "config" / "watchlist.yaml"
+	if path.exists():
+		data = yaml.safe_load(path.read_text()) or {}
+		cfg = WatchlistConfig(**{k: v for k, v in data.items() if k != "severity"})
+		cfg.severity.update(data.get("severity") or {})
+		return cfg
+	return WatchlistConfig()
+
+
+@dataclass
+class AlertEvent:
+	alert_id: Optional[int]
+	scan_id: Optional[int]
+	loan_id: int
+	assessment_id: int
+	as_of_date: date
+	baseline_assessment_id: int
+	baseline_as_of_date: date
+	rule: str
+	severity: str
+	message: str
+
+	def to_json(self) -> str:
+		data = asdict(self)
+		data["as_of_date"] = self.as_of_date.isoformat()
+		data["baseline_as_of_date"] = self.baseline_as_of_date.isoformat()
+		return json.dumps(data)
+
+
+def _grade_order() -> List[str]:
+	order = [r.grade for r in load_grading_config().rules]
+	for g in ("D", "E"):  # grade_and_recommend fallbacks
+		if g not in order:
+			order.append(g)
+	return order
+
+
+def comparison_query(cfg: WatchlistConfig, after_id: int, upto_id: int, baseline_date: Optional[date] = None) -> Select:
+	"""Assessments recorded in (after_id, upto_id] joined to their baselines, filtered to rule hits.
+
+	By default every new assessment is compared with the loan's previous one, so a change is caught
+	even when further assessments land before the next scan. With baseline_date only the loan's
+	latest assessment is compared, against its latest one on or before that date.
+	"""
+	touched = select(RiskAssessment.loan_id).where(RiskAssessment.assessment_id > after_id, RiskAssessment.assessment_id <= upto_id)
+	newest_first = (RiskAssessment.as_of_date.desc(), RiskAssessment.assessment_id.desc())
+	cols = (
+		RiskAssessment.assessment_id,
+		RiskAssessment.loan_id,
+		RiskAssessment.as_of_date,
+		RiskAssessment.dscr,
+		RiskAssessment.risk_grade,
+		RiskAssessment.recommendation,
+	)
+	if baseline_date is None:
+		oldest_first = (RiskAssessment.as_of_date, RiskAssessment.assessment_id)
+		lag_cols = [
+			func.lag(c, type_=c.type).over(partition_by=RiskAssessment.loan_id, order_by=oldest_first).label(f"base_{c.key}")
+			for c in cols
+			if c.key != "loan_id"
+		]
+		lagged = (
+			select(*cols, *lag_cols)
+			.where(RiskAssessment.loan_id.in_(touched), RiskAssessment.assessment_id <= upto_id)
+			.subquery()
+		)
+		pairs = select(lagged).where(lagged.c.assessment_id > after_id).subquery()
+	else:
+		cur = (
+			select(*cols, func.row_number().over(partition_by=RiskAssessment.loan_id, order_by=newest_first).label("rn"))
+			.where(RiskAssessment.loan_id.in_(touched), RiskAssessment.assessment_id <= upto_id)
+			.subquery()
+		)
+		base = (
+			select(
+				*[c.label(f"base_{c.key}") for c in cols],
+				func.row_number().over(partition_by=RiskAssessment.loan_id, order_by=newest_first).label("base_rn"),
+			)
+			.where(RiskAssessment.loan_id.in_(touched), RiskAssessment.as_of_date <= baseline_date)
+			.subquery()
+		)
+		pairs = (
+			select(cur, *[c for c in base.c if c.key not in ("base_loan_id", "base_rn")])
+			.join(base, and_(base.c.base_loan_id == cur.c.loan_id, base.c.base_rn == 1))
+			.where(cur.c.rn == 1, cur.c.assessment_id > after_id, cur.c.assessment_id != base.c.base_assessment_id)
+			.subquery()
+		)
+
+	order = {g: i for i, g in enumerate(_grade_order())}
+	hits = []
+	if cfg.min_grade_notches > 0:
+		notches = case(order, value=pairs.c.risk_grade) - case(order, value=pairs.c.base_risk_grade)
+		hits.append((notches >= cfg.min_grade_notches).label("grade_downgrade"))
+	if cfg.dscr_floor is not None:
+		hits.append(and_(pairs.c.dscr < cfg.dscr_floor, pairs.c.base_dscr >= cfg.dscr_floor).label("dscr_below_floor"))
+	if cfg.decline_flip:
+		hits.append(and_(pairs.c.recommendation == "Decline", pairs.c.base_recommendation != "Decline").label("decline"))
+	flagged = select(pairs, *hits).where(pairs.c.base_assessment_id.is_not(None)).subquery()
+	if not hits:
+		return select(flagged).where(false())
+	return select(flagged).where(or_(*[flagged.c[h.key] == 1 for h in hits])).order_by(flagged.c.loan_id, flagged.c.as_of_date, flagged.c.assessment_id)
+
+
+def _message(rule: str, row) -> str:
+	if rule == "grade_downgrade":
+		return f"Grade {row.base_risk_grade} -> {row.risk_grade}"
+	if rule == "dscr_below_floor":
+		return f"DSCR {row.base_dscr:.2f} -> {row.dscr:.2f}"
+	return f"Recommendation {row.base_recommendation} -> {row.recommendation}"
+
+
+def run_watchlist_scan(session: Session, cfg: Optional[WatchlistConfig] = None, baseline_date: Optional[date] = None, since_last_scan: bool = True) -> Tuple[WatchlistScan, List[AlertEvent]]:
+	"""Detect alerts for assessments recorded since the previous scan and store them with a new scan watermark."""
+	cfg = cfg or load_watchlist_config()
+	after_id = 0
+	if since_last_scan:
+		after_id = session.execute(select(func.max(WatchlistScan.to_assessment_id))).scalar() or 0
+	upto_id = session.execute(select(func.max(RiskAssessment.assessment_id))).scalar() or 0
+	scan = WatchlistScan(scanned_at=datetime.utcnow(), from_assessment_id=after_id, to_assessment_id=max(upto_id, after_id), baseline_date=baseline_date, alerts_emitted=0)
+	session.add(scan)
+	session.flush()
+
+	events: List[AlertEvent] = []
+	pending: List[Tuple[WatchlistAlert, object]] = []
+	if upto_id > after_id:
+		rows = session.execute(comparison_query(cfg, after_id, upto_id, baseline_date)).all()
+		existing = set()
+		if rows and not since_last_scan:
+			ids = [r.assessment_id for r in rows]
+			existing = set(session.execute(select(WatchlistAlert.assessment_id, WatchlistAlert.rule).where(WatchlistAlert.assessment_id.in_(ids))).tuples())
+		for row in rows:
+			for rule in RULES:
+				if not getattr(row, rule, False) or (row.assessment_id, rule) in existing:
+					continue
+				alert = WatchlistAlert(
+					scan_id=scan.scan_id,
+					loan_id=row.loan_id,
+					assessment_id=row.assessment_id,
+					baseline_assessment_id=row.base_assessment_id,
+					rule=rule,
+					severity=cfg.severity.get(rule, "medium"),
+					message=_message(rule, row),
+				)
+				session.add(alert)
+				pending.append((alert, row))
+		session.flush()
+		events = [
+			AlertEvent(
+				alert_id=alert.alert_id,
+				scan_id=scan.scan_id,
+				loan_id=alert.loan_id,
+				assessment_id=alert.assessment_id,
+				as_of_date=row.as_of_date,
+				baseline_assessment_id=alert.baseline_assessment_id,
+				baseline_as_of_date=row.base_as_of_date,
+				rule=alert.rule,
+				severity=alert.severity,
+				message=alert.message,
+			)
+			for alert, row in pending
+		]
+	scan.alerts_emitted = len(events)
+	session.flush()
+	return scan, events
+
+
+def append_alerts_jsonl(events: List[AlertEvent], path: Path) -> None:
+	if not events:
+		return
+	path.parent.mkdir(parents=True, exist_ok=True)
+	with path.open("a") as f:
+		for ev in events:
+			f.write(ev.to_json() + "\n")
+
+
+def recent_alerts(session: Session, limit: int = 50) -> List[WatchlistAlert]:
+	return session.execute(select(WatchlistAlert).order_by(WatchlistAlert.alert_id.desc()).limit(limit)).scalars().all()
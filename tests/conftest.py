@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from loan_risk_analyzer import repositories as repo
+from loan_risk_analyzer.cache import repo_cache
+from loan_risk_analyzer.db import init_db
+
+BORROWER = "Test Co"
+LOAN_COUNT = 5
+
+
+@pytest.fixture()
+def engine(tmp_path):
+	eng = create_engine(f"sqlite:///{tmp_path / 'test.db'}", future=True)
+	init_db(eng)
+	yield eng
+	repo_cache.clear()
+	eng.dispose()
+
+
+@pytest.fixture()
+def Session(engine):
+	"""Session factory over a database with one borrower, its financials and LOAN_COUNT collateralised loans."""
+	factory = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False, future=True)
+	with factory.begin() as s:
+		b = repo.get_or_create_borrower(s, BORROWER, "Manufacturing", "CA", "Mid")
+		for _ in range(LOAN_COUNT):
+			loan = repo.create_loan(s, b.borrower_id, 1_000_000, 0.07, 60, 240, date(2024, 1, 1), "WC")
+			col = repo.add_collateral(s, b.borrower_id, "RealEstate", 1_500_000, date(2024, 1, 1), 0.2)
+			repo.link_loan_collateral(s, loan.loan_id, col.collateral_id)
+		repo.upsert_financials(s, b.borrower_id, period_start=date(2023, 1, 1), period_end=date(2023, 12, 31), revenue=2_000_000, operating_expenses=1_200_000)
+	repo_cache.clear()
+	repo_cache.reset_stats()
+	return factory
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import json
+from datetime import date
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from loan_risk_analyzer import repositories as repo
+from loan_risk_analyzer.jobs import WorkerPool, claim_jobs, enqueue_loan, enqueue_loans, enqueue_portfolio, queue_depth
+from loan_risk_analyzer.models import AssessmentJob, RiskAssessment
+
+
+def test_repeated_requests_collapse_onto_waiting_job(Session):
+	with Session.begin() as s:
+		first = enqueue_loan(s, 1)
+		assert enqueue_loan(s, 1) == first
+		assert enqueue_loans(s, [3, 2]) == enqueue_loans(s, [2, 3])
+		claim_jobs(s, "w0", batch_size=10)
+		assert enqueue_loan(s, 1) != first
+		assert queue_depth(s)["queued"] == 1
+
+
+def test_worker_pool_drains_portfolio(Session):
+	with Session.begin() as s:
+		enqueue_portfolio(s)
+		enqueue_loan(s, 1)
+	stats = WorkerPool(Session, workers=3, batch_size=2, poll_interval=0.01).run(drain=True, report_interval=0.05)
+	with Session() as s:
+		depth = queue_depth(s)
+		assessed = s.execute(select(RiskAssessment.loan_id).distinct()).scalars().all()
+	assert depth["queued"] == depth["running"] == depth["failed"] == 0
+	assert sorted(assessed) == [1, 2, 3, 4, 5]
+	assert stats.failed == 0 and stats.succeeded == depth["done"]
+
+
+def test_unassessable_loan_fails_without_retry(Session):
+	with Session.begin() as s:
+		job_id = enqueue_loan(s, 999)
+	stats = WorkerPool(Session, workers=1, poll_interval=0.01).run(drain=True, report_interval=0.05)
+	with Session() as s:
+		job = s.get(AssessmentJob, job_id)
+	assert job.status == "failed" and job.attempts == 1
+	assert "not found" in job.last_error
+	assert stats.retried == 0
+
+
+def test_transient_error_is_retried_with_backoff(Session, monkeypatch):
+	from loan_risk_analyzer import jobs
+
+	real = jobs.assess_loan
+	calls = {"n": 0}
+
+	def flaky(session, loan_id):
+		calls["n"] += 1
+		if calls["n"] == 1:
+			raise RuntimeError("database is locked")
+		return real(session, loan_id)
+
+	monkeypatch.setattr(jobs, "assess_loan", flaky)
+	with Session.begin() as s:
+		job_id = enqueue_loan(s, 2)
+	stats = WorkerPool(Session, workers=1, poll_interval=0.01, backoff_base=0.01).run(drain=True, report_interval=0.05)
+	with Session() as s:
+		job = s.get(AssessmentJob, job_id)
+	assert (job.status, job.attempts, stats.retried, stats.succeeded) == ("done", 2, 1, 1)
+
+
+def test_release_next_to_queued_twin_supersedes_instead_of_requeueing(Session):
+	with Session.begin() as s:
+		enqueue_loan(s, 1)
+		enqueue_loan(s, 2)
+		claims = [(job.job_id, job.claimed_by) for job in claim_jobs(s, "w0", batch_size=10)]
+		twin = enqueue_loan(s, 1)
+	WorkerPool(Session)._release(claims)
+	with Session() as s:
+		first, second = (s.get(AssessmentJob, job_id) for job_id, _ in claims)
+		assert (first.status, json.loads(first.result)) == ("superseded", {"superseded_by": twin})
+		assert (second.status, second.attempts, second.claimed_by) == ("queued", 0, None)
+
+
+def test_worker_survives_failed_round(Session, monkeypatch, caplog):
+	from loan_risk_analyzer import jobs
+
+	real = jobs.claim_jobs
+	calls = {"n": 0}
+
+	def locked_once(*args, **kwargs):
+		calls["n"] += 1
+		if calls["n"] == 1:
+			raise RuntimeError("database is locked")
+		return real(*args, **kwargs)
+
+	monkeypatch.setattr(jobs, "claim_jobs", locked_once)
+	with Session.begin() as s:
+		job_id = enqueue_loan(s, 3)
+	stats = WorkerPool(Session, workers=1, poll_interval=0.01).run(drain=True, report_interval=0.05)
+	with Session() as s:
+		assert s.get(AssessmentJob, job_id).status == "done"
+	assert stats.succeeded == 1
+	assert "database is locked" in caplog.text
+
+
+def test_retry_next_to_queued_twin_is_superseded_not_failed(Session, monkeypatch):
+	from loan_risk_analyzer import jobs
+
+	real = jobs.assess_loan
+	calls = {"n": 0}
+
+	def fails_while_twin_is_queued(session, loan_id):
+		calls["n"] += 1
+		if calls["n"] == 1:
+			with Session.begin() as other:
+				enqueue_loan(other, loan_id)
+			raise RuntimeError("database is locked")
+		return real(session, loan_id)
+
+	monkeypatch.setattr(jobs, "assess_loan", fails_while_twin_is_queued)
+	with Session.begin() as s:
+		job_id = enqueue_loan(s, 4)
+	stats = WorkerPool(Session, workers=1, poll_interval=0.01).run(drain=True, report_interval=0.05)
+	with Session() as s:
+		job = s.get(AssessmentJob, job_id)
+		depth = queue_depth(s)
+	assert job.status == "superseded" and "database is locked" in job.last_error
+	assert (depth["done"], depth["superseded"], depth["failed"]) == (1, 1, 0)
+	assert (stats.succeeded, stats.superseded, stats.failed) == (1, 1, 0)
+
+
+def test_worker_in_another_process_sees_new_financials(Session, engine):
+	# The app writes through the fixture's engine; the worker runs on its own engine, as in a separate process.
+	worker_engine = create_engine(engine.url, future=True)
+	WorkerSession = sessionmaker(bind=worker_engine, autoflush=False, expire_on_commit=False, future=True)
+	with Session.begin() as s:
+		enqueue_loan(s, 1)
+	WorkerPool(WorkerSession, workers=1, poll_interval=0.01).run(drain=True, report_interval=0.05)  # caches borrower 1's 2023 financials in the worker
+	with Session.begin() as s:
+		repo.upsert_financials(s, 1, period_start=date(2025, 1, 1), period_end=date(2025, 12, 31), revenue=1_100_000, operating_expenses=1_000_000)
+		enqueue_loan(s, 2)
+	WorkerPool(WorkerSession, workers=1, poll_interval=0.01).run(drain=True, report_interval=0.05)
+	worker_engine.dispose()
+	with Session() as s:
+		ra = repo.latest_assessment_for_loan(s, 2)
+	assert round(ra.dscr, 2) == 1.07
+	assert (ra.risk_grade, ra.recommendation) == ("E", "Decline")
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import re
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine, event, inspect, text
+
+from loan_risk_analyzer import repositories as repo
+from loan_risk_analyzer.jobs import _requeue, claim_jobs
+from loan_risk_analyzer.cache import repo_cache
+from loan_risk_analyzer.db import init_db
+from loan_risk_analyzer.migrations import current_version, latest_version
+
+from conftest import BORROWER
+
+
+@pytest.fixture()
+def session(Session):
+	with Session() as s:
+		repo.record_assessment(s, 1, date(2024, 1, 1), 1.4, 0.67, 1.2, 0.02, "B", "Approve", None, "default")
+		s.commit()
+		yield s
+
+
+def _capture(engine):
+	statements = []
+
+	def listener(conn, cursor, statement, parameters, context, executemany):
+		if statement.lstrip().upper().startswith(("SELECT", "UPDATE")):
+			statements.append((statement, parameters))
+
+	event.listen(engine, "before_cursor_execute", listener)
+	return statements, lambda: event.remove(engine, "before_cursor_execute", listener)
+
+
+def _plan(engine, statement, parameters):
+	with engine.connect() as conn:
+		rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+	return [r[-1] for r in rows]
+
+
+HOT_QUERIES = {
+	"get_or_create_borrower": lambda s: repo.get_or_create_borrower(s, BORROWER, None, None, None),
+	"get_loan": lambda s: repo.get_loan(s, 1),
+	"list_active_loans": lambda s: repo.list_active_loans(s),
+	"latest_financials_for_borrower": lambda s: repo.latest_financials_for_borrower(s, 1),
+	"upsert_financials": lambda s: repo.upsert_financials(s, 1, period_start=date(2023, 1, 1), period_end=date(2023, 12, 31), revenue=2_000_000, operating_expenses=1_200_000),
+	"total_collateral_values_for_loan": lambda s: repo.total_collateral_values_for_loan(s, 1),
+	"latest_assessment_for_loan": lambda s: repo.latest_assessment_for_loan(s, 1),
+	"borrower_loans": lambda s: repo.get_loan(s, 1).borrower.loans,
+	"borrower_collateral": lambda s: repo.get_loan(s, 1).borrower.collateral,
+	"collateral_pledges": lambda s: repo.get_loan(s, 1).pledges[0].collateral.pledges,
+	"record_loan_outcome": lambda s: repo.record_loan_outcome(s, 1, date(2024, 6, 30), "repaid"),
+	"underwriting_inputs_for_loan": lambda s: repo.underwriting_inputs_for_active_loans(s, [1]),
+	"claim_jobs": lambda s: claim_jobs(s, "w0", batch_size=10),
+	"requeue_job": lambda s: _requeue(s, 1, "w0:token"),
+}
+
+# Deliberate full-book reads, kept out of HOT_QUERIES so a new unindexed lookup cannot hide among them.
+FULL_BOOK_SCANS = {
+	# Sensitivity and export-deals read every active loan's latest financials and collateral in one
+	# pass; a scan per table is cheaper than one index seek per loan.
+	"underwriting_inputs_for_active_loans": lambda s: repo.underwriting_inputs_for_active_loans(s),
+}
+
+
+_MATERIALIZED = re.compile(r"SCAN (\(subquery-\d+\)|anon_\d+)( |$)")
+
+
+def _regressions(plan):
+	"""Full scans or sorts. Only scans of already-filtered subqueries, which SQLAlchemy names anon_N and
+	SQLite (subquery-N), and sorts within one index seek ("RIGHT PART OF ORDER BY") are allowed, so
+	scans of aliased tables (assessment_jobs_1) are still caught."""
+	return [
+		step for step in plan
+		if (step.startswith("SCAN ") and not _MATERIALIZED.match(step)) or ("TEMP B-TREE" in step and "RIGHT PART" not in step)
+	]
+
+
+@pytest.mark.parametrize("name", sorted(HOT_QUERIES))
+def test_hot_query_uses_index(engine, session, name):
+	session.expunge_all()
+	repo_cache.clear()
+	statements, stop = _capture(engine)
+	try:
+		HOT_QUERIES[name](session)
+	finally:
+		stop()
+	assert statements, f"{name} issued no query"
+	for statement, parameters in statements:
+		plan = _plan(engine, statement, parameters)
+		assert not _regressions(plan), f"{name} plan regressed: {plan}\n{statement}"
+
+
+@pytest.mark.parametrize("name", sorted(FULL_BOOK_SCANS))
+def test_full_book_scans_are_not_hot_queries(engine, session, name):
+	statements, stop = _capture(engine)
+	try:
+		FULL_BOOK_SCANS[name](session)
+	finally:
+		stop()
+	assert name not in HOT_QUERIES
+	assert any(_regressions(_plan(engine, st, params)) for st, params in statements), f"{name} no longer scans; move it to HOT_QUERIES"
+
+
+def test_migrate_adds_indexes_to_existing_database(tmp_path):
+	eng = create_engine(f"sqlite:///{tmp_path / 'old.db'}", future=True)
+	init_db(eng)
+	with eng.begin() as conn:
+		for name in ("ix_loans_status", "ix_risk_assessments_loan_asof"):
+			conn.execute(text(f"DROP INDEX {name}"))
+		conn.execute(text("DROP TABLE schema_migrations"))
+	init_db(eng)
+	indexes = {ix["name"] for ix in inspect(eng).get_indexes("loans")} | {ix["name"] for ix in inspect(eng).get_indexes("risk_assessments")}
+	assert {"ix_loans_status", "ix_risk_assessments_loan_asof"} <= indexes
+	with eng.connect() as conn:
+		assert current_version(conn) == latest_version()
+	eng.dispose()
+
+
+def test_migrate_rebuilds_claim_index_in_claim_order(tmp_path):
+	eng = create_engine(f"sqlite:///{tmp_path / 'old.db'}", future=True)
+	init_db(eng)
+	with eng.begin() as conn:
+		conn.execute(text("DROP INDEX ix_assessment_jobs_claim"))
+		conn.execute(text("CREATE INDEX ix_assessment_jobs_claim ON assessment_jobs (status, priority, available_at)"))
+		conn.execute(text("DELETE FROM schema_migrations WHERE version = 2"))
+	init_db(eng)
+	with eng.connect() as conn:
+		columns = [(row[2], row[3]) for row in conn.exec_driver_sql("PRAGMA index_xinfo(ix_assessment_jobs_claim)") if row[5]]
+	assert columns == [("status", 0), ("priority", 1), ("job_id", 0)]
+	eng.dispose()
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+from datetime import date
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from loan_risk_analyzer import repositories as repo
+from loan_risk_analyzer.cache import MISSING, LRUCache, repo_cache
+
+from conftest import BORROWER
+
+
+def _count_selects(factory):
+	counter = {"n": 0}
+
+	def listener(conn, cursor, statement, parameters, context, executemany):
+		if statement.lstrip().upper().startswith("SELECT"):
+			counter["n"] += 1
+
+	event.listen(factory.kw["bind"], "before_cursor_execute", listener)
+	return counter
+
+
+def test_repeat_lookups_hit_cache_without_select(Session):
+	with Session() as s:
+		repo.get_loan(s, 1)
+		repo.get_or_create_borrower(s, BORROWER, None, None, None)
+		repo.latest_financials_for_borrower(s, 1)
+		repo.total_collateral_values_for_loan(s, 1)
+	counter = _count_selects(Session)
+	with Session() as s:
+		loan = repo.get_loan(s, 1)
+		assert loan.amount == 1_000_000
+		assert repo.get_or_create_borrower(s, BORROWER, None, None, None).borrower_id == loan.borrower_id
+		assert repo.latest_financials_for_borrower(s, 1).revenue == 2_000_000
+		assert repo.total_collateral_values_for_loan(s, 1) == (1_500_000, 1_200_000)
+	assert counter["n"] == 0
+	stats = repo_cache.stats()
+	assert (stats.hits, stats.misses) == (4, 4)
+
+
+def test_repository_writes_invalidate(Session):
+	with Session() as s:
+		repo.latest_financials_for_borrower(s, 1)
+		repo.total_collateral_values_for_loan(s, 1)
+		repo.get_loan(s, 1)
+	with Session() as s:
+		repo.upsert_financials(s, 1, period_start=date(2024, 1, 1), period_end=date(2024, 12, 31), revenue=3_000_000, operating_expenses=1_000_000)
+		col = repo.add_collateral(s, 1, "Equipment", 500_000, date(2024, 1, 1), 0.5)
+		repo.link_loan_collateral(s, 1, col.collateral_id)
+		repo.record_loan_outcome(s, 1, date(2025, 1, 1), "default", True)
+		s.commit()
+	with Session() as s:
+		assert repo.latest_financials_for_borrower(s, 1).revenue == 3_000_000
+		assert repo.total_collateral_values_for_loan(s, 1) == (2_000_000, 1_450_000)
+		assert repo.get_loan(s, 1).status == "defaulted"
+
+
+def test_rolled_back_rows_are_not_cached(Session):
+	with Session() as s:
+		repo.get_or_create_borrower(s, "Ghost LLC", None, None, None)
+		assert repo.get_or_create_borrower(s, "Ghost LLC", None, None, None) is not None
+		s.rollback()
+	with Session() as s:
+		b = repo.get_or_create_borrower(s, "Ghost LLC", "Retail", None, None)
+		assert b.industry == "Retail"
+
+
+def test_writes_from_another_engine_are_seen(Session, engine):
+	with Session() as s:
+		assert repo.get_loan(s, 1).status == "active"
+		assert repo.latest_financials_for_borrower(s, 1).revenue == 2_000_000
+	# A second engine on the same file stands in for another process writing to the database.
+	other = create_engine(engine.url, future=True)
+	with sessionmaker(bind=other).begin() as s:
+		repo.record_loan_outcome(s, 1, date(2025, 1, 1), "default")
+		repo.upsert_financials(s, 1, period_start=date(2024, 1, 1), period_end=date(2024, 12, 31), revenue=900_000, operating_expenses=800_000)
+	other.dispose()
+	with Session() as s:
+		assert repo.get_loan(s, 1).status == "defaulted"
+		assert repo.latest_financials_for_borrower(s, 1).revenue == 900_000
+
+
+def test_unflushed_edits_survive_repeat_lookup(Session):
+	with Session() as s:
+		repo.get_loan(s, 1)
+	with Session() as s:
+		loan = repo.get_loan(s, 1)  # cache hit attached to this session
+		loan.amount = 2_500_000
+		again = repo.get_loan(s, 1)
+		assert again is loan and again.amount == 2_500_000
+		assert repo.latest_financials_for_borrower(s, 1) is repo.latest_financials_for_borrower(s, 1)
+
+
+def test_fill_racing_a_committed_write_is_dropped(Session, monkeypatch):
+	snapshot = repo._snapshot
+
+	def snapshot_then_concurrent_write(obj):
+		# Another session commits between this session's SELECT and its cache fill.
+		monkeypatch.setattr(repo, "_snapshot", snapshot)
+		with Session.begin() as writer:
+			repo.record_loan_outcome(writer, 1, date(2025, 1, 1), "default")
+		return snapshot(obj)
+
+	monkeypatch.setattr(repo, "_snapshot", snapshot_then_concurrent_write)
+	with Session() as s:
+		assert repo.get_loan(s, 1).status == "active"
+	with Session() as s:
+		assert repo.get_loan(s, 1).status == "defaulted"
+
+
+def test_put_with_stale_generation_is_dropped():
+	cache = LRUCache(maxsize=1)
+	before = cache.generation("a")
+	cache.invalidate("a")
+	cache.put("a", 1, before)
+	assert cache.get("a") is MISSING
+	cache.put("a", 1, cache.generation("a"))
+	assert cache.get("a") == 1
+	# Forgetting a's generation (maxsize 1) raises the floor instead of resetting it.
+	stale = cache.generation("a")
+	cache.invalidate("a")
+	cache.invalidate("b")
+	cache.put("a", 2, stale)
+	assert cache.get("a") is MISSING
+
+
+def test_lru_evicts_least_recently_used():
+	cache = LRUCache(maxsize=2)
+	cache.put("a", 1)
+	cache.put("b", 2)
+	cache.get("a")
+	cache.put("c", 3)
+	assert cache.get("b") is MISSING
+	assert cache.get("a") == 1
+	assert cache.stats().evictions == 1
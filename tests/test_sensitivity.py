@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import math
+
+import numpy as np
+import pytest
+
+from loan_risk_analyzer import calculations as calc
+from loan_risk_analyzer.grading import grade_and_recommend, load_grading_config
+from loan_risk_analyzer.pd_model import PDModel
+from loan_risk_analyzer.sensitivity import BookInputs, compute_sensitivities, max_rate_for_debt_service
+
+
+def _book(n: int = 400, seed: int = 11) -> BookInputs:
+	rng = np.random.default_rng(seed)
+	amount = rng.uniform(250_000, 5_000_000, n)
+	rate = rng.uniform(0.03, 0.12, n)
+	months = rng.choice([0, 60, 120, 240, 360], n).astype(float)
+	ads = np.array([calc.annual_debt_service(a, r, int(m)) for a, r, m in zip(amount, rate, months)])
+	appraised = amount / rng.uniform(0.35, 1.0, n)
+	return BookInputs(
+		loan_id=np.arange(1, n + 1),
+		amount=amount,
+		interest_rate=rate,
+		amortization_months=months,
+		noi=ads * rng.uniform(0.9, 2.6, n),
+		appraised_total=appraised,
+		haircut_total=appraised * rng.uniform(0.5, 0.95, n),
+	)
+
+
+def test_max_rate_hits_hard_dscr_floor():
+	cfg = load_grading_config()
+	book = _book()
+	result = compute_sensitivities(book, PDModel(), cfg)
+	solved = 0
+	for amount, months, noi, max_rate in zip(book.amount, book.amortization_months, book.noi, result["max_rate"]):
+		if math.isnan(max_rate):
+			# Straight-line principal alone already breaches the floor.
+			assert calc.compute_dscr(noi, calc.annual_debt_service(amount, 0.0, int(months))) < cfg.min_dscr_hard
+			continue
+		ads = calc.annual_debt_service(amount, max_rate, int(months))
+		assert calc.compute_dscr(noi, ads) == pytest.approx(cfg.min_dscr_hard, rel=1e-9)
+		solved += 1
+	assert solved > 300
+
+
+def test_interest_only_max_rate_is_closed_form():
+	principal = np.array([1_000_000.0, 2_500_000.0])
+	ceiling = np.array([90_000.0, 100_000.0])
+	out = max_rate_for_debt_service(principal, ceiling, np.zeros(2))
+	assert out.tolist() == pytest.approx([0.09, 0.04], abs=1e-15)
+
+
+def test_zero_noi_has_no_rate_or_noi_cushion():
+	book = BookInputs(
+		loan_id=np.array([1, 2]),
+		amount=np.array([1_000_000.0, 1_000_000.0]),
+		interest_rate=np.array([0.07, 0.07]),
+		amortization_months=np.array([240.0, 0.0]),
+		noi=np.zeros(2),
+		appraised_total=np.array([1_500_000.0, 1_500_000.0]),
+		haircut_total=np.array([1_200_000.0, 1_200_000.0]),
+	)
+	result = compute_sensitivities(book, PDModel(), load_grading_config())
+	assert math.isnan(result["max_rate"][0])
+	assert result["max_rate"][1] == 0.0
+	assert np.isnan(result["noi_cushion_pct"]).all()
+	# A ceiling below straight-line principal has no rate at all.
+	assert math.isnan(max_rate_for_debt_service(np.array([1_000_000.0]), np.array([30_000.0]), np.array([360.0]))[0])
+
+
+def test_grade_cushion_is_where_grade_and_recommend_changes():
+	model = PDModel()
+	book = _book()
+	result = compute_sensitivities(book, model, load_grading_config())
+
+	def grade(i: int, decline: float) -> tuple:
+		s = 1.0 - decline
+		amount = book.amount[i]
+		ads = calc.annual_debt_service(amount, book.interest_rate[i], int(book.amortization_months[i]))
+		dscr = calc.compute_dscr(book.noi[i], ads)
+		ltv = calc.compute_ltv(amount, book.appraised_total[i] * s)
+		coverage = calc.compute_collateral_coverage(book.haircut_total[i] * s, amount)
+		return grade_and_recommend(dscr, ltv, model.predict(dscr, ltv, coverage))
+
+	checked = 0
+	for i, x in enumerate(result["collateral_cushion_grade_pct"]):
+		if not 1e-4 < x < 1.0 - 1e-4:
+			continue
+		assert grade(i, x - 1e-7) == grade(i, 0.0)
+		assert grade(i, x + 1e-7) != grade(i, 0.0)
+		checked += 1
+	assert checked > 100
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from datetime import date
+
+from loan_risk_analyzer import repositories as repo
+from loan_risk_analyzer.watchlist import WatchlistConfig, run_watchlist_scan
+
+CFG = WatchlistConfig(dscr_floor=1.25, min_grade_notches=1, decline_flip=True)
+
+
+def _assess(session, loan_id: int, day: int, grade: str, dscr: float, recommendation: str = "Approve") -> int:
+	row = repo.record_assessment(session, loan_id, date(2024, 1, day), dscr, 0.6, 1.2, 0.02, grade, recommendation, None, "test")
+	return row.assessment_id
+
+
+def _scan(Session, **kwargs):
+	with Session.begin() as s:
+		scan, events = run_watchlist_scan(s, CFG, **kwargs)
+		return scan, sorted((ev.loan_id, ev.rule) for ev in events)
+
+
+def test_each_rule_fires_on_its_own_change(Session):
+	with Session.begin() as s:
+		for loan_id in (1, 2, 3, 4):
+			_assess(s, loan_id, 1, "B", 1.40)
+		_assess(s, 1, 2, "C", 1.40)  # one notch down, DSCR above floor
+		_assess(s, 2, 2, "B", 1.20)  # DSCR crosses floor, grade unchanged
+		_assess(s, 3, 2, "B", 1.40, "Decline")  # recommendation flip only
+		_assess(s, 4, 2, "A", 1.60)  # improvement
+	_, events = _scan(Session)
+	assert events == [(1, "grade_downgrade"), (2, "dscr_below_floor"), (3, "decline")]
+
+
+def test_scan_watermark_and_repeat_scan(Session):
+	with Session.begin() as s:
+		_assess(s, 1, 1, "B", 1.40)
+		last = _assess(s, 1, 2, "E", 1.00, "Decline")
+	scan, events = _scan(Session)
+	assert (scan.from_assessment_id, scan.to_assessment_id) == (0, last)
+	assert events == [(1, "decline"), (1, "dscr_below_floor"), (1, "grade_downgrade")]
+
+	scan, events = _scan(Session)
+	assert (scan.from_assessment_id, scan.to_assessment_id, scan.alerts_emitted) == (last, last, 0)
+	assert events == []
+
+	# A full rescan re-evaluates history but does not duplicate stored alerts.
+	_, events = _scan(Session, since_last_scan=False)
+	assert events == []
+
+
+def test_change_followed_by_reassessment_before_scan_is_not_lost(Session):
+	with Session.begin() as s:
+		_assess(s, 1, 1, "B", 1.40)
+	assert _scan(Session)[1] == []
+	with Session.begin() as s:
+		_assess(s, 1, 2, "E", 1.00, "Decline")
+		_assess(s, 1, 3, "E", 1.00, "Decline")
+	_, events = _scan(Session)
+	assert events == [(1, "decline"), (1, "dscr_below_floor"), (1, "grade_downgrade")]
+
+
+def test_baseline_date_compares_latest_with_snapshot(Session):
+	with Session.begin() as s:
+		_assess(s, 1, 1, "A", 1.60)
+		_assess(s, 1, 5, "B", 1.40)
+		_assess(s, 1, 9, "C", 1.30)
+	_, events = _scan(Session, baseline_date=date(2024, 1, 1))
+	# One downgrade, A -> C, rather than one per step.
+	assert events == [(1, "grade_downgrade")]